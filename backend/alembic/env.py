@@ -5,6 +5,7 @@ from logging.config import fileConfig
 import asyncio
 from sqlalchemy import pool
 from sqlalchemy.engine import Connection
+from sqlalchemy.orm import configure_mappers
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
@@ -13,6 +14,9 @@ from app.core.config import settings
 from app.db.database import Base
 from app.models import *  # Импортируем все модели
 
+# Конфигурируем мапперы сразу, а не лениво при первом обращении
+configure_mappers()
+
 # this is the Alembic Config object
 config = context.config
 
@@ -20,7 +24,8 @@ config = context.config
 config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
 
 # Interpret the config file for Python logging.
-if config.config_file_name is not None:
+# При запуске из приложения (app/db/migrations.py) логирование уже настроено
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
@@ -35,6 +40,8 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_schemas=False,
+        compare_type=True,
     )
 
     with context.begin_transaction():
@@ -42,7 +49,14 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # Только схема public; в SQLAlchemy 2.x autogenerate отражает таблицы
+    # пакетно (get_multi_*), а не отдельным запросом на каждую таблицу
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_schemas=False,
+        compare_type=True,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
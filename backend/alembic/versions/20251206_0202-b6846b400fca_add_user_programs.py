@@ -35,9 +35,11 @@ def upgrade() -> None:
         sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index(op.f('ix_user_programs_id'), 'user_programs', ['id'], unique=False)
-    op.create_index(op.f('ix_user_programs_program_id'), 'user_programs', ['program_id'], unique=False)
-    op.create_index(op.f('ix_user_programs_user_id'), 'user_programs', ['user_id'], unique=False)
+    # Индексы строим CONCURRENTLY вне транзакции миграции, чтобы не блокировать запись в таблицу
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_user_programs_id'), 'user_programs', ['id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_user_programs_program_id'), 'user_programs', ['program_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_user_programs_user_id'), 'user_programs', ['user_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
 
 
 def downgrade() -> None:
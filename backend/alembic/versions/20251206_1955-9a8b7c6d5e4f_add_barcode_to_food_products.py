@@ -22,23 +22,35 @@ def upgrade():
     op.add_column('food_products', sa.Column('source', sa.String(), nullable=True))
     op.add_column('food_products', sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True))
     
-    # Создаем индексы
-    op.create_index('ix_food_products_barcode', 'food_products', ['barcode'], unique=True)
+    # Создаем индексы CONCURRENTLY вне транзакции, чтобы не блокировать запись в food_products
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_food_products_barcode', 'food_products', ['barcode'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
     
-    # Добавляем FK для пользовательских продуктов
-    op.create_foreign_key(
-        'fk_food_products_user',
-        'food_products', 'users',
-        ['user_id'], ['id'],
-        ondelete='CASCADE'
+    # Добавляем FK для пользовательских продуктов как NOT VALID: существующие строки
+    # не сканируются под эксклюзивной блокировкой
+    op.execute(
+        "ALTER TABLE food_products ADD CONSTRAINT fk_food_products_user "
+        "FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE NOT VALID"
     )
 
+    # Индекс под FK и валидация ограничения - вне транзакции, с более слабыми блокировками
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_food_products_user_id', 'food_products', ['user_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True
+        )
+        op.execute("ALTER TABLE food_products VALIDATE CONSTRAINT fk_food_products_user")
+
 
 def downgrade():
     # Удаляем FK
     op.drop_constraint('fk_food_products_user', 'food_products', type_='foreignkey')
     
     # Удаляем индексы
+    op.drop_index('ix_food_products_user_id', 'food_products', if_exists=True)
     op.drop_index('ix_food_products_barcode', 'food_products')
     
     # Удаляем колонки
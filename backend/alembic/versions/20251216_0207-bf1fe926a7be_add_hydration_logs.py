@@ -33,7 +33,7 @@ def upgrade() -> None:
     op.create_index(op.f('ix_hydration_logs_user_id'), 'hydration_logs', ['user_id'], unique=False)
     op.drop_index(op.f('ix_food_products_name'), table_name='food_products')
     op.create_index(op.f('ix_food_products_name'), 'food_products', ['name'], unique=False)
-    op.create_index(op.f('ix_food_products_user_id'), 'food_products', ['user_id'], unique=False)
+    op.create_index(op.f('ix_food_products_user_id'), 'food_products', ['user_id'], unique=False, if_not_exists=True)
     # ### end Alembic commands ###
 
 
@@ -0,0 +1,54 @@
+"""add_articles_search_tsv
+
+Revision ID: 3d2c13999fb4
+Revises: 6108a3aa8ab7
+Create Date: 2026-10-15 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d2c13999fb4'
+down_revision: Union[str, None] = '6108a3aa8ab7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # array_to_string не IMMUTABLE, поэтому для generated column нужна обертка
+    op.execute(
+        "CREATE OR REPLACE FUNCTION articles_tags_to_text(tags varchar[]) RETURNS text "
+        "LANGUAGE sql IMMUTABLE AS $$ SELECT coalesce(array_to_string(tags, ' '), '') $$"
+    )
+
+    op.execute(
+        "ALTER TABLE articles ADD COLUMN search_tsv tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple'::regconfig, coalesce(excerpt, '')), 'B') || "
+        "to_tsvector('simple'::regconfig, articles_tags_to_text(tags))"
+        ") STORED"
+    )
+
+    # GIN индексы строим CONCURRENTLY, чтобы не блокировать запись в articles
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_articles_search_tsv', 'articles', ['search_tsv'],
+            postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_articles_title_trgm', 'articles', ['title'],
+            postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_articles_title_trgm', table_name='articles')
+    op.drop_index('ix_articles_search_tsv', table_name='articles')
+    op.drop_column('articles', 'search_tsv')
+    op.execute("DROP FUNCTION IF EXISTS articles_tags_to_text(varchar[])")
@@ -0,0 +1,36 @@
+"""add_articles_published_created_index
+
+Revision ID: 7e41a9c2d5b8
+Revises: 3d2c13999fb4
+Create Date: 2026-10-15 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e41a9c2d5b8'
+down_revision: Union[str, None] = '3d2c13999fb4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Частичный индекс под список опубликованных статей (ORDER BY created_at DESC)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_articles_published_created', 'articles', [sa.text('created_at DESC')],
+            postgresql_where=sa.text('is_published = true'),
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_articles_published_created', table_name='articles',
+            postgresql_concurrently=True, if_exists=True
+        )
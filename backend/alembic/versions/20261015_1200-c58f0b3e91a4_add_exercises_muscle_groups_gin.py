@@ -0,0 +1,42 @@
+"""add_exercises_muscle_groups_gin
+
+Revision ID: c58f0b3e91a4
+Revises: 7e41a9c2d5b8
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c58f0b3e91a4'
+down_revision: Union[str, None] = '7e41a9c2d5b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # B-tree по массиву не помогает операторам @> / &&, заменяем на GIN
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_exercises_muscle_groups_gin', 'exercises', ['muscle_groups'],
+            postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_exercises_muscle_groups', table_name='exercises',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_exercises_muscle_groups', 'exercises', ['muscle_groups'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_exercises_muscle_groups_gin', table_name='exercises',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,36 @@
+"""add_body_metrics_user_date_id_index
+
+Revision ID: e2a7d4f6b013
+Revises: c58f0b3e91a4
+Create Date: 2026-10-15 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7d4f6b013'
+down_revision: Union[str, None] = 'c58f0b3e91a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс под keyset пагинацию замеров: WHERE user_id ORDER BY date DESC, id DESC
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_body_metrics_user_date_id', 'body_metrics',
+            ['user_id', sa.text('date DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_body_metrics_user_date_id', table_name='body_metrics',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,47 @@
+"""add_body_metrics_covering_index
+
+Revision ID: 4b9e2c7a8d31
+Revises: e2a7d4f6b013
+Create Date: 2026-10-15 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b9e2c7a8d31'
+down_revision: Union[str, None] = 'e2a7d4f6b013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Тот же ключ, что у ix_body_metrics_user_date_id, плюс weight в INCLUDE:
+    # последний вес для TDEE читается index-only scan без обращения к таблице
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_body_metrics_user_date', 'body_metrics',
+            ['user_id', sa.text('date DESC'), sa.text('id DESC')],
+            postgresql_include=['weight'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_body_metrics_user_date_id', table_name='body_metrics',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_body_metrics_user_date_id', 'body_metrics',
+            ['user_id', sa.text('date DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_body_metrics_user_date', table_name='body_metrics',
+            postgresql_concurrently=True, if_exists=True
+        )
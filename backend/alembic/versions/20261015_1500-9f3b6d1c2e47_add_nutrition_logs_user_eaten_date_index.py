@@ -0,0 +1,36 @@
+"""add_nutrition_logs_user_eaten_date_index
+
+Revision ID: 9f3b6d1c2e47
+Revises: 4b9e2c7a8d31
+Create Date: 2026-10-15 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f3b6d1c2e47'
+down_revision: Union[str, None] = '4b9e2c7a8d31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Выражение индекса совпадает с фильтром date(eaten_at) = :date в сводке за день
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_nutrition_logs_user_eaten_date', 'nutrition_logs',
+            ['user_id', sa.text('date(eaten_at)')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_nutrition_logs_user_eaten_date', table_name='nutrition_logs',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,45 @@
+"""add_nutrition_logs_user_eaten_index
+
+Revision ID: b27e8a4f0c95
+Revises: 9f3b6d1c2e47
+Create Date: 2026-10-15 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b27e8a4f0c95'
+down_revision: Union[str, None] = '9f3b6d1c2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Фильтры по дате переписаны на диапазон eaten_at, функциональный индекс больше не нужен
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_nutrition_logs_user_eaten', 'nutrition_logs',
+            ['user_id', sa.text('eaten_at DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_nutrition_logs_user_eaten_date', table_name='nutrition_logs',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_nutrition_logs_user_eaten_date', 'nutrition_logs',
+            ['user_id', sa.text('date(eaten_at)')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_nutrition_logs_user_eaten', table_name='nutrition_logs',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,71 @@
+"""add_nutrition_logs_product_snapshot
+
+Revision ID: d4c81f5e6a29
+Revises: b27e8a4f0c95
+Create Date: 2026-10-15 17:00:00.000000
+
+"""
+import uuid
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4c81f5e6a29'
+down_revision: Union[str, None] = 'b27e8a4f0c95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    # Снимок КБЖУ продукта в записи дневника (nullable: добавление колонки без перезаписи таблицы)
+    op.add_column('nutrition_logs', sa.Column('product_name', sa.String(), nullable=True))
+    op.add_column('nutrition_logs', sa.Column('calories_per_100g', sa.Float(), nullable=True))
+    op.add_column('nutrition_logs', sa.Column('proteins_per_100g', sa.Float(), nullable=True))
+    op.add_column('nutrition_logs', sa.Column('fats_per_100g', sa.Float(), nullable=True))
+    op.add_column('nutrition_logs', sa.Column('carbs_per_100g', sa.Float(), nullable=True))
+
+    # Заполняем существующие записи порциями по id (keyset), каждая порция
+    # в своей транзакции; записи без продукта просто остаются без снимка
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last_id = uuid.UUID(int=0)
+        while True:
+            ids = bind.execute(
+                sa.text(
+                    "SELECT id FROM nutrition_logs WHERE id > :last_id "
+                    "ORDER BY id LIMIT :batch"
+                ),
+                {"last_id": last_id, "batch": BATCH_SIZE}
+            ).scalars().all()
+            if not ids:
+                break
+
+            bind.execute(
+                sa.text("""
+                    UPDATE nutrition_logs AS l
+                    SET product_name = p.name,
+                        calories_per_100g = p.calories,
+                        proteins_per_100g = p.proteins,
+                        fats_per_100g = p.fats,
+                        carbs_per_100g = p.carbs
+                    FROM food_products AS p
+                    WHERE p.id = l.product_id
+                      AND l.id BETWEEN :first_id AND :last_id
+                      AND l.calories_per_100g IS NULL
+                """),
+                {"first_id": ids[0], "last_id": ids[-1]}
+            )
+            last_id = ids[-1]
+
+
+def downgrade() -> None:
+    op.drop_column('nutrition_logs', 'carbs_per_100g')
+    op.drop_column('nutrition_logs', 'fats_per_100g')
+    op.drop_column('nutrition_logs', 'proteins_per_100g')
+    op.drop_column('nutrition_logs', 'calories_per_100g')
+    op.drop_column('nutrition_logs', 'product_name')
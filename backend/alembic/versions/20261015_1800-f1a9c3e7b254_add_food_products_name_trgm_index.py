@@ -0,0 +1,38 @@
+"""add_food_products_name_trgm_index
+
+Revision ID: f1a9c3e7b254
+Revises: d4c81f5e6a29
+Create Date: 2026-10-15 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a9c3e7b254'
+down_revision: Union[str, None] = 'd4c81f5e6a29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Триграммный GIN индекс обслуживает поиск name ILIKE '%...%'
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_food_products_name_trgm', 'food_products', ['name'],
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    # Расширение не удаляем: им могут пользоваться другие объекты БД
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_food_products_name_trgm', table_name='food_products',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,38 @@
+"""add_programs_muscle_groups_trgm_index
+
+Revision ID: a6d2f8b1c934
+Revises: f1a9c3e7b254
+Create Date: 2026-10-15 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2f8b1c934'
+down_revision: Union[str, None] = 'f1a9c3e7b254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Триграммный GIN индекс обслуживает фильтр target_muscle_groups ILIKE '%...%'
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_programs_target_muscle_groups_trgm', 'programs', ['target_muscle_groups'],
+            postgresql_using='gin', postgresql_ops={'target_muscle_groups': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    # Расширение не удаляем: им могут пользоваться другие объекты БД
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_programs_target_muscle_groups_trgm', table_name='programs',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,54 @@
+"""add_programs_workout_logs_keyset_indexes
+
+Revision ID: c83e5a0d7f16
+Revises: a6d2f8b1c934
+Create Date: 2026-10-15 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c83e5a0d7f16'
+down_revision: Union[str, None] = 'a6d2f8b1c934'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индексы под keyset пагинацию: ORDER BY ... DESC, id DESC + сравнение кортежей
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_programs_created_id', 'programs',
+            [sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_programs_author_created_id', 'programs',
+            ['author_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_workout_logs_user_completed_id', 'workout_logs',
+            ['user_id', sa.text('completed_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_workout_logs_user_completed_id', table_name='workout_logs',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.drop_index(
+            'ix_programs_author_created_id', table_name='programs',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.drop_index(
+            'ix_programs_created_id', table_name='programs',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,75 @@
+"""add_user_programs_user_program_unique
+
+Revision ID: e5b7c19a4d02
+Revises: c83e5a0d7f16
+Create Date: 2026-10-15 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b7c19a4d02'
+down_revision: Union[str, None] = 'c83e5a0d7f16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKUP_TABLE = 'user_programs_duplicates_backup'
+
+
+def upgrade() -> None:
+    # Убираем дубликаты пары (user_id, program_id): оставляем активную,
+    # затем самую свежую по last_interaction_at запись.
+    # Остальные записи не теряются: они копируются в BACKUP_TABLE
+    # (таблица остается после миграции, downgrade возвращает записи обратно)
+    op.execute(f"""
+        CREATE TABLE IF NOT EXISTS {BACKUP_TABLE} AS
+        SELECT * FROM user_programs WITH NO DATA
+    """)
+    op.execute(f"""
+        INSERT INTO {BACKUP_TABLE}
+        SELECT * FROM user_programs
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY user_id, program_id
+                    ORDER BY is_active DESC, last_interaction_at DESC NULLS LAST, id
+                ) AS rn
+                FROM user_programs
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+    op.execute(f"""
+        DELETE FROM user_programs
+        WHERE id IN (SELECT id FROM {BACKUP_TABLE})
+    """)
+
+    # Уникальный индекс - цель ON CONFLICT (user_id, program_id)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_programs_user_program', 'user_programs', ['user_id', 'program_id'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_programs_user_program', table_name='user_programs',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+    # Возвращаем удаленные при upgrade дубликаты (после снятия уникальности)
+    op.execute(f"""
+        INSERT INTO user_programs
+        SELECT b.* FROM {BACKUP_TABLE} b
+        -- пользователь или программа могли быть удалены после upgrade
+        WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = b.user_id)
+          AND EXISTS (SELECT 1 FROM programs p WHERE p.id = b.program_id)
+        ON CONFLICT (id) DO NOTHING
+    """)
+    op.execute(f"DROP TABLE IF EXISTS {BACKUP_TABLE}")
@@ -0,0 +1,37 @@
+"""add_workout_logs_user_program_day_index
+
+Revision ID: 7a4c0e9d2b68
+Revises: e5b7c19a4d02
+Create Date: 2026-10-15 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4c0e9d2b68'
+down_revision: Union[str, None] = 'e5b7c19a4d02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Функциональный индекс под проверку "тренировка за сегодня": date(completed_at) = :today
+    # (completed_at - timestamp without time zone, поэтому date() иммутабельна)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_workout_logs_user_program_day', 'workout_logs',
+            ['user_id', 'program_id', sa.text('date(completed_at)')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_workout_logs_user_program_day', table_name='workout_logs',
+            postgresql_concurrently=True, if_exists=True
+        )
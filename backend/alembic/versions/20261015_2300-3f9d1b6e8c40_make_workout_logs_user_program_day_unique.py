@@ -0,0 +1,85 @@
+"""make_workout_logs_user_program_day_unique
+
+Revision ID: 3f9d1b6e8c40
+Revises: 7a4c0e9d2b68
+Create Date: 2026-10-15 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9d1b6e8c40'
+down_revision: Union[str, None] = '7a4c0e9d2b68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKUP_TABLE = 'workout_logs_duplicates_backup'
+
+
+def upgrade() -> None:
+    # Оставляем одну (последнюю) запись на программу в день.
+    # Остальные записи не теряются: они копируются в BACKUP_TABLE
+    # (таблица остается после миграции, downgrade возвращает записи обратно)
+    op.execute(f"""
+        CREATE TABLE IF NOT EXISTS {BACKUP_TABLE} AS
+        SELECT * FROM workout_logs WITH NO DATA
+    """)
+    op.execute(f"""
+        INSERT INTO {BACKUP_TABLE}
+        SELECT * FROM workout_logs
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY user_id, program_id, date(completed_at)
+                    ORDER BY completed_at DESC, id
+                ) AS rn
+                FROM workout_logs
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+    op.execute(f"""
+        DELETE FROM workout_logs
+        WHERE id IN (SELECT id FROM {BACKUP_TABLE})
+    """)
+
+    # Уникальный индекс - цель ON CONFLICT в log_workout; заменяет неуникальный
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ux_workout_logs_user_program_day', 'workout_logs',
+            ['user_id', 'program_id', sa.text('date(completed_at)')],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_workout_logs_user_program_day', table_name='workout_logs',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_workout_logs_user_program_day', 'workout_logs',
+            ['user_id', 'program_id', sa.text('date(completed_at)')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ux_workout_logs_user_program_day', table_name='workout_logs',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+    # Возвращаем удаленные при upgrade дубликаты (после снятия уникальности)
+    op.execute(f"""
+        INSERT INTO workout_logs
+        SELECT b.* FROM {BACKUP_TABLE} b
+        -- пользователь или программа могли быть удалены после upgrade
+        WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = b.user_id)
+          AND EXISTS (SELECT 1 FROM programs p WHERE p.id = b.program_id)
+        ON CONFLICT (id) DO NOTHING
+    """)
+    op.execute(f"DROP TABLE IF EXISTS {BACKUP_TABLE}")
@@ -0,0 +1,46 @@
+"""add_user_programs_workout_logs_compound_indexes
+
+Revision ID: 5c2e8f4a1d97
+Revises: 3f9d1b6e8c40
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e8f4a1d97'
+down_revision: Union[str, None] = '3f9d1b6e8c40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        # Активная программа пользователя: WHERE user_id = :uid AND is_active
+        op.create_index(
+            'ix_user_programs_user_active', 'user_programs', ['user_id'],
+            postgresql_where=sa.text('is_active'),
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        # Тренировки пользователя по программе (подсчет, история с фильтром program_id)
+        op.create_index(
+            'ix_workout_logs_user_program_completed', 'workout_logs',
+            ['user_id', 'program_id', sa.text('completed_at DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_workout_logs_user_program_completed', table_name='workout_logs',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.drop_index(
+            'ix_user_programs_user_active', table_name='user_programs',
+            postgresql_concurrently=True, if_exists=True
+        )
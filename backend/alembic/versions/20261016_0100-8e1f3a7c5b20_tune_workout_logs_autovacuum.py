@@ -0,0 +1,39 @@
+"""tune_workout_logs_autovacuum
+
+Revision ID: 8e1f3a7c5b20
+Revises: 5c2e8f4a1d97
+Create Date: 2026-10-16 01:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e1f3a7c5b20'
+down_revision: Union[str, None] = '5c2e8f4a1d97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # workout_logs почти только пополняется: autovacuum по вставкам чаще обновляет
+    # карту видимости, и COUNT по (user_id, program_id) идет Index Only Scan без чтения таблицы
+    op.execute(
+        "ALTER TABLE workout_logs SET ("
+        "autovacuum_vacuum_insert_scale_factor = 0.05, "
+        "autovacuum_analyze_scale_factor = 0.05)"
+    )
+
+    # Заполняем карту видимости и статистику сразу (VACUUM нельзя выполнять в транзакции)
+    with op.get_context().autocommit_block():
+        op.execute("VACUUM (ANALYZE) workout_logs")
+
+
+def downgrade() -> None:
+    op.execute(
+        "ALTER TABLE workout_logs RESET ("
+        "autovacuum_vacuum_insert_scale_factor, "
+        "autovacuum_analyze_scale_factor)"
+    )
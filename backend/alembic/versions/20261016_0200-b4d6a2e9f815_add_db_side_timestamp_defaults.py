@@ -0,0 +1,37 @@
+"""add_db_side_timestamp_defaults
+
+Revision ID: b4d6a2e9f815
+Revises: 8e1f3a7c5b20
+Create Date: 2026-10-16 02:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d6a2e9f815'
+down_revision: Union[str, None] = '8e1f3a7c5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Колонки с временем, которое теперь ставит БД (timestamp without time zone в UTC)
+TIMESTAMP_COLUMNS = [
+    ('programs', 'created_at'),
+    ('programs', 'updated_at'),
+    ('workout_logs', 'completed_at'),
+    ('user_programs', 'start_date'),
+    ('user_programs', 'last_interaction_at'),
+]
+
+
+def upgrade() -> None:
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(table, column, server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade() -> None:
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(table, column, server_default=None)
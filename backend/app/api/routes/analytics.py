@@ -4,32 +4,45 @@ API роутер для аналитики и прогнозов
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from datetime import date
 from uuid import UUID
 from pydantic import BaseModel
 
-from app.db.database import get_db
+from app.db.database import get_db_ro
 from app.core.dependencies import get_current_active_user
 from app.models.user import User
-from app.services.predictions import calculate_tdee
+from app.services.predictions import calculate_tdee, calculate_bmr
 from app.models.user import UserProfile
-from sqlalchemy import select, desc
+from app.models.metrics import BodyMetric
+from sqlalchemy import select, desc, true
 
 router = APIRouter()
 
 
 @router.get("/tdee")
 async def get_tdee(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_ro),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Рассчитать TDEE (Total Daily Energy Expenditure) и BMR
     """
-    profile_result = await db.execute(
-        select(UserProfile).where(UserProfile.user_id == current_user.id)
+    # Профиль и последний вес одним запросом (LEFT JOIN LATERAL)
+    latest_weight = (
+        select(BodyMetric.weight)
+        .where(BodyMetric.user_id == current_user.id)
+        .where(BodyMetric.weight.isnot(None))
+        .order_by(desc(BodyMetric.date))
+        .limit(1)
+        .lateral("latest_weight")
     )
-    profile = profile_result.scalar_one_or_none()
+    result = await db.execute(
+        select(UserProfile, latest_weight.c.weight)
+        .select_from(UserProfile)
+        .outerjoin(latest_weight, true())
+        .where(UserProfile.user_id == current_user.id)
+    )
+    row = result.one_or_none()
+    profile, weight = row if row else (None, None)
     
     if not profile or not profile.height or not profile.birth_date:
         raise HTTPException(
@@ -37,28 +50,17 @@ async def get_tdee(
             detail="Необходимо заполнить профиль (рост, дата рождения)"
         )
     
-    # Получаем последний вес
-    from app.models.metrics import BodyMetric
-    weight_result = await db.execute(
-        select(BodyMetric)
-        .where(BodyMetric.user_id == current_user.id)
-        .where(BodyMetric.weight.isnot(None))
-        .order_by(desc(BodyMetric.date))
-        .limit(1)
-    )
-    weight_metric = weight_result.scalar_one_or_none()
-    
-    if not weight_metric or not weight_metric.weight:
+    if not weight:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Необходимо добавить замер веса"
         )
     
     # Рассчитываем возраст
-    age = (date.today() - profile.birth_date).days // 365
+    age = profile.age
     
     tdee = calculate_tdee(
-        weight_kg=weight_metric.weight,
+        weight_kg=weight,
         height_cm=profile.height,
         age=age,
         gender=profile.gender.value if profile.gender else "male",
@@ -66,15 +68,17 @@ async def get_tdee(
     )
     
     # BMR для справки
-    if profile.gender and profile.gender.value.lower() == "male":
-        bmr = 10 * weight_metric.weight + 6.25 * profile.height - 5 * age + 5
-    else:
-        bmr = 10 * weight_metric.weight + 6.25 * profile.height - 5 * age - 161
+    bmr = calculate_bmr(
+        weight_kg=weight,
+        height_cm=profile.height,
+        age=age,
+        gender=profile.gender.value if profile.gender else "female"
+    )
     
     return {
         "bmr": round(bmr, 1),
         "tdee": round(tdee, 1),
-        "weight_kg": weight_metric.weight,
+        "weight_kg": weight,
         "height_cm": profile.height,
         "age": age,
         "activity_level": profile.activity_level.value if profile.activity_level else "sedentary"
@@ -6,15 +6,18 @@ from pathlib import Path
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func, text
-from typing import List
+from sqlalchemy import select, insert, update, delete, or_, func
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Optional
 from uuid import UUID
 
-from app.db.database import get_db
+from app.db.database import get_db, get_db_ro
+from app.core.cache import TTLCache
 from app.core.dependencies import get_current_active_user, require_admin
 from app.models.article import Article
 from app.models.user import User
-from app.schemas.article import ArticleCreate, ArticleUpdate, ArticleResponse
+from app.schemas.article import ArticleCreate, ArticleUpdate, ArticleResponse, ArticleListItem
+from app.services.article_views import record_view, is_pending
 
 router = APIRouter()
 
@@ -22,39 +25,94 @@ router = APIRouter()
 # От backend/app/api/routes/articles.py до frontend/articles
 ARTICLES_DIR = Path(__file__).parent.parent.parent.parent.parent / "frontend" / "articles"
 
+# Общий HTTP клиент: переиспользуем соединения (TLS, DNS) между запросами
+_http = httpx.AsyncClient(timeout=5, limits=httpx.Limits(max_keepalive_connections=32))
 
-@router.get("/", response_model=List[ArticleResponse])
+# Кэш HTML контента статей: url -> html, (path, mtime) -> html
+_html_cache = TTLCache(maxsize=1024, ttl=300)
+
+
+async def close_http_client() -> None:
+    """
+    Закрыть HTTP клиент (вызывается при остановке приложения)
+    """
+    await _http.aclose()
+
+
+async def _fetch_html(url: str) -> Optional[str]:
+    """
+    Загрузить HTML статьи по URL (Cloudinary) с кэшированием
+    """
+    content = _html_cache.get(url)
+    if content is not None:
+        return content
+    
+    response = await _http.get(url)
+    if response.status_code != 200:
+        return None
+    
+    _html_cache.set(url, response.text)
+    return response.text
+
+
+def _read_local_html(html_path: Path) -> Optional[str]:
+    """
+    Прочитать локальный HTML файл статьи с кэшированием по времени изменения файла
+    """
+    try:
+        mtime = os.stat(html_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    
+    key = (str(html_path), mtime)
+    content = _html_cache.get(key)
+    if content is None:
+        content = html_path.read_text(encoding='utf-8')
+        _html_cache.set(key, content)
+    return content
+
+
+@router.get("/", response_model=List[ArticleListItem])
 async def list_articles(
     skip: int = 0,
     limit: int = 50,
     search: str = None,
     tag: str = None,
     published_only: bool = True,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_ro),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Получить список статей с фильтрацией
     """
-    query = select(Article)
+    # Выбираем только колонки ArticleListItem (Core строки без ORM identity map);
+    # массив viewed_by не нужен - вместо него считаем views_count в БД
+    query = select(
+        Article.id,
+        Article.title,
+        Article.html_file_name,
+        Article.html_file_url,
+        Article.author_id,
+        Article.tags,
+        Article.cover_image_url,
+        Article.excerpt,
+        Article.created_at,
+        Article.updated_at,
+        Article.is_published,
+        Article.views_count,
+    )
     
     # Обычные пользователи видят только опубликованные
     if published_only and current_user.role.value != "admin":
         query = query.where(Article.is_published == True)
     
     if search:
-        conditions = [Article.title.ilike(f"%{search}%")]
-        # Ищем в excerpt
-        conditions.append(Article.excerpt.isnot(None) & Article.excerpt.ilike(f"%{search}%"))
-        # Ищем в тегах - используем unnest для развертывания массива и поиска в каждом элементе
-        search_lower = search.lower()
-        # Используем raw SQL с правильным синтаксисом PostgreSQL для поиска в массиве
-        # unnest разворачивает массив в строки, затем ищем подстроку в каждом элементе
-        tag_condition = text(
-            "EXISTS (SELECT 1 FROM unnest(articles.tags) AS tag WHERE LOWER(tag::text) LIKE :pattern)"
-        ).bindparams(pattern=f"%{search_lower}%")
-        conditions.append(Article.tags.isnot(None) & tag_condition)
-        query = query.where(or_(*conditions))
+        # Полнотекстовый поиск по title/excerpt/тегам (GIN по search_tsv)
+        # + поиск подстроки в заголовке (GIN trigram индекс)
+        query = query.where(or_(
+            Article.search_tsv.op('@@')(func.websearch_to_tsquery('simple', search)),
+            Article.title.ilike(f"%{search}%")
+        ))
     
     if tag:
         query = query.where(Article.tags.contains([tag]))
@@ -62,15 +120,15 @@ async def list_articles(
     query = query.order_by(Article.created_at.desc()).offset(skip).limit(limit)
     
     result = await db.execute(query)
-    articles = result.scalars().all()
     
-    return articles
+    # Словари валидируются один раз через response_model
+    return result.mappings().all()
 
 
 @router.get("/{article_id}", response_model=ArticleResponse)
 async def get_article(
     article_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_ro),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -98,40 +156,31 @@ async def get_article(
     if article.html_file_url:
         # Читаем из Cloudinary
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(article.html_file_url)
-                if response.status_code == 200:
-                    article.content = response.text
-                else:
-                    article.content = None
+            article.content = await _fetch_html(article.html_file_url)
         except Exception as e:
             print(f"Error fetching HTML from Cloudinary: {e}")
             article.content = None
     elif article.html_file_name:
         # Читаем из локального файла
         html_path = ARTICLES_DIR / article.html_file_name
-        if html_path.exists():
-            try:
-                article.content = html_path.read_text(encoding='utf-8')
-            except Exception as e:
-                article.content = None
-        else:
+        try:
+            article.content = _read_local_html(html_path)
+        except Exception as e:
             article.content = None
     else:
         article.content = None
     
     # Добавляем пользователя в список просмотревших (если его там еще нет)
-    if article.viewed_by is None:
-        article.viewed_by = []
-    
-    # Проверяем, есть ли пользователь в списке
-    if current_user.id not in article.viewed_by:
-        # Создаем новый массив с добавленным пользователем (SQLAlchemy отслеживает изменения только при переприсваивании)
-        new_viewed_by = list(article.viewed_by) if article.viewed_by else []
-        new_viewed_by.append(current_user.id)
-        article.viewed_by = new_viewed_by
-        await db.commit()
-        await db.refresh(article)
+    viewed_by = list(article.viewed_by) if article.viewed_by else []
+    
+    if current_user.id not in viewed_by:
+        # Просмотр пишется в БД пакетно фоновой задачей (см. services/article_views)
+        if not is_pending(article_id, current_user.id):
+            record_view(article_id, current_user.id)
+        
+        # Отдаем список с учетом текущего просмотра, не помечая объект измененным
+        viewed_by.append(current_user.id)
+        set_committed_value(article, "viewed_by", viewed_by)
     
     return article
 
@@ -145,14 +194,14 @@ async def create_article(
     """
     Создать новую статью (только администраторы)
     """
-    article = Article(
-        **article_data.model_dump(),
-        author_id=current_user.id
+    # RETURNING возвращает созданную строку без отдельного refresh
+    result = await db.execute(
+        insert(Article)
+        .values(**article_data.model_dump(), author_id=current_user.id)
+        .returning(Article)
     )
-    
-    db.add(article)
+    article = result.scalar_one()
     await db.commit()
-    await db.refresh(article)
     
     return article
 
@@ -167,7 +216,19 @@ async def update_article(
     """
     Обновить статью (только администраторы)
     """
-    result = await db.execute(select(Article).where(Article.id == article_id))
+    # Обновляем только переданные поля одним UPDATE ... RETURNING
+    update_data = article_data.model_dump(exclude_unset=True)
+    if update_data:
+        stmt = (
+            update(Article)
+            .where(Article.id == article_id)
+            .values(**update_data)
+            .returning(Article)
+        )
+    else:
+        stmt = select(Article).where(Article.id == article_id)
+    
+    result = await db.execute(stmt)
     article = result.scalar_one_or_none()
     
     if not article:
@@ -176,13 +237,7 @@ async def update_article(
             detail="Статья не найдена"
         )
     
-    # Обновляем только переданные поля
-    update_data = article_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(article, field, value)
-    
     await db.commit()
-    await db.refresh(article)
     
     return article
 
@@ -196,16 +251,19 @@ async def delete_article(
     """
     Удалить статью (только администраторы)
     """
-    result = await db.execute(select(Article).where(Article.id == article_id))
-    article = result.scalar_one_or_none()
+    # Один DELETE без предварительного SELECT
+    result = await db.execute(
+        delete(Article)
+        .where(Article.id == article_id)
+        .execution_options(synchronize_session=False)
+    )
     
-    if not article:
+    if result.rowcount == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Статья не найдена"
         )
     
-    await db.delete(article)
     await db.commit()
     
     return None
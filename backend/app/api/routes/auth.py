@@ -8,7 +8,7 @@ from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
 from app.db.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token, create_refresh_token
+from app.core.security import verify_password_async, get_password_hash_async, create_access_token, create_refresh_token
 from app.models.user import User, UserProfile, UserRole
 from app.schemas.user import UserCreate, UserLogin, Token, UserResponse, UserWithProfile
 
@@ -38,7 +38,7 @@ async def register(
         )
     
     # Создаем нового пользователя
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         email=user_data.email,
         password_hash=hashed_password,
@@ -83,7 +83,8 @@ async def login(
     result = await db.execute(select(User).where(User.email == form_data.username))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    password_ok = await verify_password_async(form_data.password, user.password_hash if user else None)
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
@@ -119,7 +120,8 @@ async def login_json(
     result = await db.execute(select(User).where(User.email == credentials.email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(credentials.password, user.password_hash):
+    password_ok = await verify_password_async(credentials.password, user.password_hash if user else None)
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
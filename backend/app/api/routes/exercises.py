@@ -1,42 +1,97 @@
 """
 API роутер для упражнений
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, insert, update, delete, bindparam, func, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 from uuid import UUID
 
 from app.db.database import get_db
+from app.core.cache import TTLCache
 from app.core.dependencies import get_current_active_user, require_admin
+from app.core.responses import model_response, model_list_response_async
 from app.models.exercise import Exercise
 from app.models.user import User
 from app.schemas.exercise import ExerciseCreate, ExerciseUpdate, ExerciseResponse
 
 router = APIRouter()
 
+_MIN_UUID = UUID(int=0)
+
+# Запросы собираются один раз при импорте; параметры передаются при выполнении
+# Keyset пагинация по id: cursor_id по умолчанию - нулевой UUID (меньше любого id)
+_LIST_EXERCISES = (
+    select(Exercise)
+    .where(Exercise.id > bindparam("cursor_id"))
+    .order_by(Exercise.id)
+    .offset(bindparam("skip"))
+    .limit(bindparam("limit"))
+)
+_LIST_EXERCISES_BY_MUSCLE_GROUP = _LIST_EXERCISES.where(
+    # Пересечение массивов (&&) обслуживается GIN индексом
+    Exercise.muscle_groups.overlap(bindparam("muscle_groups", type_=ARRAY(String)))
+)
+
+# Кэш готовых ответов справочника упражнений
+# Ключ строится только из параметров запроса (без db и current_user),
+# при изменении упражнений кэш сбрасывается
+_exercise_cache = TTLCache(maxsize=512, ttl=300)
+
 
 @router.get("/", response_model=List[ExerciseResponse])
 async def list_exercises(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0, le=10000),
+    limit: int = Query(100, ge=1, le=200),
     muscle_group: str = None,
+    cursor_id: Optional[UUID] = None,
+    with_total: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Получить список упражнений
+    
+    Для постраничной загрузки передавайте cursor_id из заголовка X-Next-Cursor-Id
+    предыдущей страницы (skip при этом не нужен)
+    
+    with_total=true добавляет заголовок X-Total-Count - число упражнений,
+    подходящих под фильтры (начиная с cursor_id, если он передан)
     """
-    query = select(Exercise)
-
+    cache_key = ("list", skip, limit, muscle_group, cursor_id, with_total)
+    cached = _exercise_cache.get(cache_key)
+    if cached is not None:
+        body, headers = cached
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    params = {"skip": skip, "limit": limit, "cursor_id": cursor_id or _MIN_UUID}
     if muscle_group:
-        query = query.where(Exercise.muscle_groups.contains([muscle_group]))
-
-    query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
-    exercises = result.scalars().all()
-
-    return exercises
+        query = _LIST_EXERCISES_BY_MUSCLE_GROUP
+        params["muscle_groups"] = [muscle_group]
+    else:
+        query = _LIST_EXERCISES
+
+    headers = {}
+    if with_total:
+        # Общее количество считается оконной функцией в том же запросе
+        query = query.add_columns(func.count().over().label("total"))
+        rows = (await db.execute(query, params)).all()
+        exercises = [row[0] for row in rows]
+        if rows:
+            headers["X-Total-Count"] = str(rows[0].total)
+    else:
+        result = await db.execute(query, params)
+        exercises = result.scalars().all()
+
+    if len(exercises) == limit:
+        headers["X-Next-Cursor-Id"] = str(exercises[-1].id)
+    
+    response = await model_list_response_async(ExerciseResponse, exercises)
+    response.headers.update(headers)
+    _exercise_cache.set(cache_key, (response.body, headers))
+    return response
 
 
 @router.get("/{exercise_id}", response_model=ExerciseResponse)
@@ -48,8 +103,13 @@ async def get_exercise(
     """
     Получить упражнение по ID
     """
-    result = await db.execute(select(Exercise).where(Exercise.id == exercise_id))
-    exercise = result.scalar_one_or_none()
+    cache_key = ("get", exercise_id)
+    cached = _exercise_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
+    # Поиск по первичному ключу (identity map сессии, затем БД)
+    exercise = await db.get(Exercise, exercise_id)
     
     if not exercise:
         raise HTTPException(
@@ -57,7 +117,9 @@ async def get_exercise(
             detail="Упражнение не найдено"
         )
     
-    return exercise
+    response = model_response(ExerciseResponse, exercise)
+    _exercise_cache.set(cache_key, response.body)
+    return response
 
 
 @router.post("/", response_model=ExerciseResponse, status_code=status.HTTP_201_CREATED)
@@ -69,22 +131,26 @@ async def create_exercise(
     """
     Создать новое упражнение (только для администраторов)
     """
-    # Проверяем уникальность названия
-    result = await db.execute(select(Exercise).where(Exercise.name == exercise_data.name))
-    existing = result.scalar_one_or_none()
-    
-    if existing:
+    # INSERT ... RETURNING вместо add + refresh;
+    # уникальность названия проверяет уникальный индекс ix_exercises_name
+    try:
+        result = await db.execute(
+            insert(Exercise).values(**dict(exercise_data)).returning(Exercise)
+        )
+        exercise = result.scalar_one()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Упражнение с таким названием уже существует"
         )
     
-    exercise = Exercise(**exercise_data.model_dump())
-    db.add(exercise)
+    # Кэш сбрасывается после commit: иначе параллельный GET успеет
+    # закэшировать данные до изменения
     await db.commit()
-    await db.refresh(exercise)
+    _exercise_cache.clear()
     
-    return exercise
+    return model_response(ExerciseResponse, exercise, status.HTTP_201_CREATED)
 
 
 @router.put("/{exercise_id}", response_model=ExerciseResponse)
@@ -97,8 +163,18 @@ async def update_exercise(
     """
     Обновить упражнение (только для администраторов)
     """
-    result = await db.execute(select(Exercise).where(Exercise.id == exercise_id))
-    exercise = result.scalar_one_or_none()
+    # Обновляем только переданные поля одним UPDATE ... RETURNING
+    update_data = {field: getattr(exercise_data, field) for field in exercise_data.model_fields_set}
+    if update_data:
+        result = await db.execute(
+            update(Exercise)
+            .where(Exercise.id == exercise_id)
+            .values(**update_data)
+            .returning(Exercise)
+        )
+        exercise = result.scalar_one_or_none()
+    else:
+        exercise = await db.get(Exercise, exercise_id)
     
     if not exercise:
         raise HTTPException(
@@ -106,15 +182,10 @@ async def update_exercise(
             detail="Упражнение не найдено"
         )
     
-    # Обновляем только переданные поля
-    update_data = exercise_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(exercise, field, value)
-    
     await db.commit()
-    await db.refresh(exercise)
+    _exercise_cache.clear()
     
-    return exercise
+    return model_response(ExerciseResponse, exercise)
 
 
 @router.delete("/{exercise_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -126,17 +197,22 @@ async def delete_exercise(
     """
     Удалить упражнение (только для администраторов)
     """
-    result = await db.execute(select(Exercise).where(Exercise.id == exercise_id))
-    exercise = result.scalar_one_or_none()
+    # Детали программ удаляются каскадом на стороне БД (ON DELETE CASCADE)
+    result = await db.execute(
+        delete(Exercise)
+        .where(Exercise.id == exercise_id)
+        .returning(Exercise.id)
+        .execution_options(synchronize_session=False)
+    )
     
-    if not exercise:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Упражнение не найдено"
         )
     
-    await db.delete(exercise)
     await db.commit()
+    _exercise_cache.clear()
     
     return None
 
@@ -1,33 +1,59 @@
 """
 API роутер для метрик тела
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, insert, update, delete, bindparam, func, tuple_
+from typing import List, Optional
 from datetime import date, timedelta
 from uuid import UUID
 
-from app.db.database import get_db
+from app.db.database import get_db, get_db_with_commit
 from app.core.dependencies import get_current_active_user
+from app.core.responses import model_response, model_list_response_async
 from app.models.metrics import BodyMetric
 from app.models.user import User
 from app.schemas.metrics import BodyMetricCreate, BodyMetricUpdate, BodyMetricResponse
 
 router = APIRouter()
 
+# Максимум замеров в одном пакетном запросе
+MAX_METRICS_BATCH = 100
+
+# Запросы собираются один раз при импорте; параметры передаются при выполнении
+_GET_METRIC_BY_ID_AND_USER = select(BodyMetric).where(
+    BodyMetric.id == bindparam("id"),
+    BodyMetric.user_id == bindparam("user_id")
+)
+_LATEST_METRIC = (
+    select(BodyMetric)
+    .where(BodyMetric.user_id == bindparam("user_id"))
+    .order_by(BodyMetric.date.desc(), BodyMetric.id.desc())
+    .limit(1)
+)
+
 
 @router.get("/", response_model=List[BodyMetricResponse])
 async def get_my_metrics(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0, le=10000),
+    limit: int = Query(100, ge=1, le=200),
     from_date: date = None,
     to_date: date = None,
+    cursor: Optional[date] = None,
+    cursor_id: Optional[UUID] = None,
+    with_total: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Получить свои замеры с опциональной фильтрацией по датам
+    
+    Для постраничной загрузки передавайте cursor и cursor_id из заголовков
+    X-Next-Cursor и X-Next-Cursor-Id предыдущей страницы (skip при этом не нужен)
+    
+    with_total=true добавляет заголовок X-Total-Count - число замеров,
+    подходящих под фильтры (начиная с курсора, если он передан)
     """
     query = select(BodyMetric).where(BodyMetric.user_id == current_user.id)
     
@@ -37,12 +63,55 @@ async def get_my_metrics(
     if to_date:
         query = query.where(BodyMetric.date <= to_date)
     
-    query = query.order_by(BodyMetric.date.desc()).offset(skip).limit(limit)
+    if cursor and cursor_id:
+        # Сравнение кортежей использует индекс (user_id, date DESC, id DESC)
+        query = query.where(tuple_(BodyMetric.date, BodyMetric.id) < tuple_(cursor, cursor_id))
+    
+    query = query.order_by(BodyMetric.date.desc(), BodyMetric.id.desc()).offset(skip).limit(limit)
+    
+    total = None
+    if with_total:
+        # Общее количество считается оконной функцией в том же запросе
+        rows = (await db.execute(query.add_columns(func.count().over().label("total")))).all()
+        metrics = [row[0] for row in rows]
+        if rows:
+            total = rows[0].total
+    else:
+        result = await db.execute(query)
+        metrics = result.scalars().all()
+    
+    response = await model_list_response_async(BodyMetricResponse, metrics)
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    if len(metrics) == limit:
+        response.headers["X-Next-Cursor"] = metrics[-1].date.isoformat()
+        response.headers["X-Next-Cursor-Id"] = str(metrics[-1].id)
+    return response
+
+
+@router.get("/export")
+async def export_my_metrics(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Выгрузить всю историю замеров (NDJSON, по одному замеру в строке)
+    
+    Строки читаются серверным курсором и отправляются клиенту по мере получения,
+    без загрузки всей истории в память
+    """
+    result = await db.stream_scalars(
+        select(BodyMetric)
+        .where(BodyMetric.user_id == current_user.id)
+        .order_by(BodyMetric.date.desc(), BodyMetric.id.desc())
+        .execution_options(yield_per=500)
+    )
     
-    result = await db.execute(query)
-    metrics = result.scalars().all()
+    async def rows():
+        async for metric in result:
+            yield BodyMetricResponse.model_validate(metric).model_dump_json() + "\n"
     
-    return metrics
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 
 @router.get("/latest", response_model=BodyMetricResponse)
@@ -53,12 +122,7 @@ async def get_latest_metric(
     """
     Получить последний замер
     """
-    result = await db.execute(
-        select(BodyMetric)
-        .where(BodyMetric.user_id == current_user.id)
-        .order_by(BodyMetric.date.desc())
-        .limit(1)
-    )
+    result = await db.execute(_LATEST_METRIC, {"user_id": current_user.id})
     metric = result.scalar_one_or_none()
     
     if not metric:
@@ -67,44 +131,87 @@ async def get_latest_metric(
             detail="Замеры не найдены"
         )
     
-    return metric
+    return model_response(BodyMetricResponse, metric)
 
 
 @router.post("/", response_model=BodyMetricResponse, status_code=status.HTTP_201_CREATED)
 async def create_metric(
     metric_data: BodyMetricCreate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_with_commit, scope="function"),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Добавить новый замер
     """
-    metric = BodyMetric(
-        user_id=current_user.id,
-        **metric_data.model_dump()
+    # INSERT ... RETURNING вместо add + refresh
+    result = await db.execute(
+        insert(BodyMetric)
+        .values(user_id=current_user.id, **dict(metric_data))
+        .returning(BodyMetric)
     )
+    metric = result.scalar_one()
+    
+    return model_response(BodyMetricResponse, metric, status.HTTP_201_CREATED)
+
+
+@router.post("/batch", response_model=List[BodyMetricResponse], status_code=status.HTTP_201_CREATED)
+async def create_metrics_batch(
+    items: List[BodyMetricCreate],
+    db: AsyncSession = Depends(get_db_with_commit, scope="function"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Добавить несколько замеров одним запросом
+    """
+    if not items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Список замеров пуст"
+        )
     
-    db.add(metric)
-    await db.commit()
-    await db.refresh(metric)
+    if len(items) > MAX_METRICS_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Можно добавить не более {MAX_METRICS_BATCH} замеров за раз"
+        )
+    
+    # Пакетный INSERT ... RETURNING: все строки отправляются за один раз
+    result = await db.scalars(
+        insert(BodyMetric).returning(BodyMetric),
+        [{"user_id": current_user.id, **dict(item)} for item in items]
+    )
+    metrics = result.all()
     
-    return metric
+    response = await model_list_response_async(BodyMetricResponse, metrics)
+    response.status_code = status.HTTP_201_CREATED
+    return response
 
 
 @router.put("/{metric_id}", response_model=BodyMetricResponse)
 async def update_metric(
     metric_id: UUID,
     metric_data: BodyMetricUpdate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_with_commit, scope="function"),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Изменить замер (дату менять нельзя)
     """
-    result = await db.execute(
-        select(BodyMetric)
-        .where(BodyMetric.id == metric_id, BodyMetric.user_id == current_user.id)
-    )
+    # Обновляем только переданные поля одним UPDATE ... RETURNING
+    update_data = {field: getattr(metric_data, field) for field in metric_data.model_fields_set}
+    if update_data:
+        stmt = (
+            update(BodyMetric)
+            .where(BodyMetric.id == metric_id, BodyMetric.user_id == current_user.id)
+            .values(**update_data)
+            .returning(BodyMetric)
+        )
+        result = await db.execute(stmt)
+    else:
+        result = await db.execute(
+            _GET_METRIC_BY_ID_AND_USER,
+            {"id": metric_id, "user_id": current_user.id}
+        )
     metric = result.scalar_one_or_none()
     
     if not metric:
@@ -113,40 +220,30 @@ async def update_metric(
             detail="Замер не найден"
         )
     
-    # Обновляем только переданные поля
-    update_data = metric_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(metric, field, value)
-    
-    await db.commit()
-    await db.refresh(metric)
-    
-    return metric
+    return model_response(BodyMetricResponse, metric)
 
 
 @router.delete("/{metric_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_metric(
     metric_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_with_commit, scope="function"),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Удалить замер
     """
     result = await db.execute(
-        select(BodyMetric)
+        delete(BodyMetric)
         .where(BodyMetric.id == metric_id, BodyMetric.user_id == current_user.id)
+        .returning(BodyMetric.id)
+        .execution_options(synchronize_session=False)
     )
-    metric = result.scalar_one_or_none()
     
-    if not metric:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Замер не найден"
         )
     
-    await db.delete(metric)
-    await db.commit()
-    
     return None
 
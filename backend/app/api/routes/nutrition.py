@@ -1,19 +1,27 @@
 """
 API роутер для питания и трекинга калорий
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
-from datetime import date, datetime
+from sqlalchemy import select, insert, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import List, Optional, Tuple
+from datetime import date, datetime, time, timedelta, timezone
 from uuid import UUID
+import asyncio
+import base64
+import binascii
 import io
 import logging
+import uuid
+import numpy as np
 
 from app.db.database import get_db
+from app.db.functions import typed_row, utc_today
 from app.core.dependencies import get_current_active_user, require_admin
-from app.models.nutrition import FoodProduct, NutritionLog
-from app.models.user import User, UserProfile
+from app.models.nutrition import FoodProduct, NutritionLog, HydrationLog
+from app.models.metrics import BodyMetric
+from app.models.user import User
 from app.schemas.nutrition import (
     FoodProductCreate,
     FoodProductResponse,
@@ -25,43 +33,189 @@ from app.schemas.nutrition import (
     BarcodeLogCreate
 )
 from pydantic import BaseModel, Field
-from app.services.openfoodfacts import get_product_by_barcode
-from app.services.product_recognition import recognize_product
+from app.services.openfoodfacts import cached_get_product_by_barcode
+from app.services.recognition_queue import RecognitionQueueFull, recognition_queue
 from app.core.config import settings
+from app.core.cache import TTLCache
+from app.core.responses import model_response, model_list_response_async, cached_json_response
 
 logger = logging.getLogger(__name__)
 
+# Опциональный быстрый декодер штрихкодов
+try:
+    import zxingcpp
+except ImportError:
+    zxingcpp = None
+
 router = APIRouter()
 
+# Кэш готовых ответов списка продуктов (ключ - параметры запроса),
+# сбрасывается при добавлении продуктов в этом воркере
+_products_cache = TTLCache(maxsize=1024, ttl=60)
+
+
+def _encode_cursor(value: str) -> str:
+    """
+    Кодирует курсор в base64url (названия продуктов не помещаются в latin-1 заголовки)
+    """
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> str:
+    """
+    Декодирует курсор из заголовка X-Next-Cursor
+    """
+    try:
+        return base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (binascii.Error, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор"
+        )
+
+
+async def _insert_product_if_name_free(db: AsyncSession, values: dict) -> Optional[FoodProduct]:
+    """
+    INSERT продукта, только если продукта с таким названием еще нет
+    
+    Уникального ограничения на name нет (в таблице уже могут быть дубли),
+    поэтому ON CONFLICT здесь не применим. Одного INSERT ... WHERE NOT EXISTS
+    недостаточно: два параллельных запроса оба не видят строку друг друга и оба
+    вставляют. Поэтому сначала берется advisory-блокировка по названию до конца
+    транзакции: второй запрос ждет commit первого, а его INSERT (новый снимок
+    в READ COMMITTED) уже видит вставленную строку
+    
+    Returns:
+        Созданный продукт или None, если название занято
+    """
+    values = {"id": uuid.uuid4(), **values}
+    await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(values["name"]))))
+    
+    row = typed_row(FoodProduct, values).where(
+        # correlate(None): подзапрос не должен коррелировать с целевой таблицей INSERT
+        ~select(FoodProduct.id).where(FoodProduct.name == values["name"]).correlate(None).exists()
+    )
+    result = await db.execute(
+        insert(FoodProduct).from_select(list(values), row).returning(FoodProduct)
+    )
+    return result.scalar_one_or_none()
+
+
+async def _upsert_product_by_barcode(db: AsyncSession, product_data: dict) -> FoodProduct:
+    """
+    Сохраняет продукт из Open Food Facts: INSERT ... ON CONFLICT (barcode) DO NOTHING,
+    при конфликте (продукт уже добавлен параллельным запросом) читает существующий
+    """
+    result = await db.execute(
+        pg_insert(FoodProduct)
+        .values(**product_data)
+        .on_conflict_do_nothing(index_elements=["barcode"])
+        .returning(FoodProduct)
+    )
+    product = result.scalar_one_or_none()
+    
+    if product is None:
+        result = await db.execute(
+            select(FoodProduct).where(FoodProduct.barcode == product_data["barcode"])
+        )
+        product = result.scalar_one()
+    
+    return product
+
+
+def _product_snapshot(product: FoodProduct) -> dict:
+    """
+    Поля продукта, которые копируются в запись дневника
+    """
+    return {
+        "product_name": product.name,
+        "calories_per_100g": product.calories,
+        "proteins_per_100g": product.proteins,
+        "fats_per_100g": product.fats,
+        "carbs_per_100g": product.carbs,
+    }
+
+
+def _per_portion(value_per_100g: Optional[float], multiplier: float) -> Optional[float]:
+    return None if value_per_100g is None else round(value_per_100g * multiplier, 2)
+
+
+def _log_response(log: NutritionLog) -> dict:
+    """
+    Запись дневника с КБЖУ, рассчитанными по весу порции
+    """
+    multiplier = log.weight_g / 100.0
+    return {
+        "id": log.id,
+        "user_id": log.user_id,
+        "product_id": log.product_id,
+        "weight_g": log.weight_g,
+        "eaten_at": log.eaten_at,
+        "meal_type": log.meal_type,
+        "notes": log.notes,
+        "calories": _per_portion(log.calories_per_100g, multiplier),
+        "proteins": _per_portion(log.proteins_per_100g, multiplier),
+        "fats": _per_portion(log.fats_per_100g, multiplier),
+        "carbs": _per_portion(log.carbs_per_100g, multiplier),
+        "product_name": log.product_name,
+    }
+
 
 # ============ Продукты ============
 
 @router.get("/products", response_model=List[FoodProductResponse])
 async def list_products(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0, le=10000),
+    limit: int = Query(100, ge=1, le=200),
     search: str = None,
     category: str = None,
+    cursor: Optional[str] = None,
+    cursor_id: Optional[UUID] = None,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Получить список продуктов с поиском
+    
+    Для постраничной загрузки передавайте cursor и cursor_id из заголовков
+    X-Next-Cursor и X-Next-Cursor-Id предыдущей страницы (skip при этом не нужен)
+    
+    Ответ содержит ETag: при совпадении If-None-Match возвращается 304
     """
+    cache_key = (search, category, skip, limit, cursor, cursor_id)
+    cached = _products_cache.get(cache_key)
+    if cached is not None:
+        body, headers = cached
+        return cached_json_response(body, if_none_match, headers)
+    
     query = select(FoodProduct)
     
     if search:
+        # Поиск по подстроке обслуживается триграммным индексом ix_food_products_name_trgm
         query = query.where(FoodProduct.name.ilike(f"%{search}%"))
     
     if category:
         query = query.where(FoodProduct.category == category)
     
-    query = query.offset(skip).limit(limit).order_by(FoodProduct.name)
+    if cursor is not None and cursor_id:
+        query = query.where(
+            tuple_(FoodProduct.name, FoodProduct.id) > tuple_(_decode_cursor(cursor), cursor_id)
+        )
+    
+    query = query.order_by(FoodProduct.name, FoodProduct.id).offset(skip).limit(limit)
     
     result = await db.execute(query)
     products = result.scalars().all()
     
-    return products
+    headers = {}
+    if len(products) == limit:
+        headers["X-Next-Cursor"] = _encode_cursor(products[-1].name)
+        headers["X-Next-Cursor-Id"] = str(products[-1].id)
+    
+    body = (await model_list_response_async(FoodProductResponse, products)).body
+    _products_cache.set(cache_key, (body, headers))
+    return cached_json_response(body, if_none_match, headers)
 
 
 @router.post("/products", response_model=FoodProductResponse, status_code=status.HTTP_201_CREATED)
@@ -73,24 +227,19 @@ async def create_product(
     """
     Создать новый продукт (только администраторы)
     """
-    # Проверяем уникальность
-    result = await db.execute(
-        select(FoodProduct).where(FoodProduct.name == product_data.name)
-    )
-    existing = result.scalar_one_or_none()
+    # Проверка уникальности названия и вставка (под блокировкой по названию)
+    product = await _insert_product_if_name_free(db, product_data.model_dump())
     
-    if existing:
+    if not product:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Продукт с таким названием уже существует"
         )
     
-    product = FoodProduct(**product_data.model_dump())
-    db.add(product)
     await db.commit()
-    await db.refresh(product)
+    _products_cache.clear()
     
-    return product
+    return model_response(FoodProductResponse, product, status.HTTP_201_CREATED)
 
 
 # ============ Barcode Scanning ============
@@ -102,6 +251,89 @@ async def test_barcode(current_user: User = Depends(get_current_active_user)):
     return {"message": "Barcode routes are working", "user_id": str(current_user.id)}
 
 
+# Максимальный размер длинной стороны изображения для распознавания штрихкода
+BARCODE_MAX_SIDE = 1600
+
+# Максимальный размер длинной стороны изображения, отправляемого AI провайдеру
+RECOGNITION_MAX_SIDE = 1024
+
+
+def _prepare_recognition_image_sync(image_data: bytes) -> bytes:
+    """
+    Уменьшает изображение и перекодирует в JPEG перед отправкой AI провайдеру
+    (синхронно, вызывать через asyncio.to_thread)
+    
+    Стоимость и время распознавания зависят от разрешения, а для одного продукта
+    на фото 1024px по длинной стороне достаточно
+    """
+    from PIL import Image, ImageOps
+    
+    image = Image.open(io.BytesIO(image_data))
+    image.thumbnail((RECOGNITION_MAX_SIDE, RECOGNITION_MAX_SIDE), Image.Resampling.LANCZOS)
+    # Поворот по EXIF: после перекодирования метаданные ориентации теряются
+    image = ImageOps.exif_transpose(image)
+    
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+# Максимальный размер загружаемого изображения и размер порции чтения
+MAX_IMAGE_UPLOAD_BYTES = 8 * 1024 * 1024
+UPLOAD_READ_CHUNK = 64 * 1024
+
+
+async def _read_limited(file: UploadFile, max_bytes: int = MAX_IMAGE_UPLOAD_BYTES) -> bytes:
+    """
+    Читает загруженный файл порциями, прерываясь при превышении max_bytes
+    """
+    data = bytearray()
+    while chunk := await file.read(UPLOAD_READ_CHUNK):
+        data.extend(chunk)
+        if len(data) > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Изображение слишком большое (максимум {max_bytes // (1024 * 1024)} МБ)"
+            )
+    return bytes(data)
+
+
+def _decode_barcodes_sync(image_data: bytes) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    Распознает штрихкоды на изображении (синхронно, вызывать через asyncio.to_thread)
+    
+    Returns:
+        Список кортежей (данные, тип, качество)
+    """
+    from PIL import Image
+    
+    # Открываем изображение
+    image = Image.open(io.BytesIO(image_data))
+    logger.info(f"Image opened: size={image.size}, mode={image.mode}")
+    
+    # Уменьшаем до BARCODE_MAX_SIDE по длинной стороне: время zbar пропорционально числу пикселей.
+    # thumbnail вызывается до загрузки пикселей, поэтому JPEG декодируется сразу в уменьшенном масштабе
+    image.thumbnail((BARCODE_MAX_SIDE, BARCODE_MAX_SIDE), Image.Resampling.BILINEAR)
+    
+    # zbar работает с яркостью: 8-битное grayscale изображение передается без конвертации
+    if image.mode != 'L':
+        image = image.convert('L')
+    
+    # Распознаем штрихкоды: ZXing-cpp быстрее zbar, pyzbar - запасной вариант
+    if settings.BARCODE_BACKEND == "zxing" and zxingcpp is not None:
+        return [
+            (barcode.text, barcode.format.name.upper(), None)
+            for barcode in zxingcpp.read_barcodes(np.asarray(image))
+        ]
+    
+    from pyzbar.pyzbar import decode as pyzbar_decode
+    
+    return [
+        (barcode.data.decode('utf-8'), barcode.type, getattr(barcode, 'quality', None))
+        for barcode in pyzbar_decode(image)
+    ]
+
+
 @router.post("/scan-barcode-image")
 async def scan_barcode_from_image(
     file: UploadFile = File(...),
@@ -120,24 +352,14 @@ async def scan_barcode_from_image(
             )
         
         # Читаем файл
-        image_data = await file.read()
+        image_data = await _read_limited(file)
         logger.info(f"Received image file: {file.filename}, size: {len(image_data)} bytes, type: {file.content_type}")
         
         # Пробуем распознать штрихкод с помощью pyzbar
         try:
-            from pyzbar.pyzbar import decode as pyzbar_decode
-            from PIL import Image
-            
-            # Открываем изображение
-            image = Image.open(io.BytesIO(image_data))
-            logger.info(f"Image opened: size={image.size}, mode={image.mode}")
-            
-            # Конвертируем в RGB, если нужно
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Распознаем штрихкоды
-            barcodes = pyzbar_decode(image)
+            # Декодирование нагружает CPU, поэтому выполняется в пуле потоков,
+            # чтобы не блокировать event loop
+            barcodes = await asyncio.to_thread(_decode_barcodes_sync, image_data)
             
             if not barcodes:
                 logger.warning("No barcodes found in image")
@@ -147,18 +369,18 @@ async def scan_barcode_from_image(
                 )
             
             # Берем первый найденный штрихкод
-            barcode = barcodes[0]
-            barcode_data = barcode.data.decode('utf-8')
-            barcode_type = barcode.type
+            barcode_data, barcode_type, quality = barcodes[0]
             
             logger.info(f"Barcode found: {barcode_data} (type: {barcode_type})")
             
             return {
                 "barcode": barcode_data,
                 "type": barcode_type,
-                "quality": barcode.quality if hasattr(barcode, 'quality') else None
+                "quality": quality
             }
             
+        except HTTPException:
+            raise
         except ImportError:
             logger.error("pyzbar or PIL not installed")
             raise HTTPException(
@@ -200,15 +422,8 @@ async def recognize_product_from_image(
             )
         
         # Читаем файл
-        image_data = await file.read()
-        print(f"\n{'='*80}")
-        print(f"🖼️  RECEIVED IMAGE FOR RECOGNITION")
-        print(f"{'='*80}")
-        print(f"📁 File: {file.filename}")
-        print(f"📏 Size: {len(image_data)} bytes")
-        print(f"👤 User ID: {current_user.id}")
-        print(f"📧 User Email: {current_user.email}")
-        logger.info(f"Received image for product recognition: {file.filename}, size: {len(image_data)} bytes, user: {current_user.id}")
+        image_data = await _read_limited(file)
+        logger.info("Received image for product recognition: %s, size: %d bytes, user: %s", file.filename, len(image_data), current_user.id)
         
         # Получаем API ключ в зависимости от провайдера
         provider = settings.PRODUCT_RECOGNITION_PROVIDER
@@ -216,9 +431,7 @@ async def recognize_product_from_image(
         # ВРЕМЕННО ОТКЛЮЧЕН: Spoonacular выдает одинаковые результаты
         # Используем OpenAI вместо Spoonacular
         if provider == "spoonacular":
-            print(f"⚠️  WARNING: Spoonacular temporarily disabled (returns same results for all images)")
-            print(f"   Falling back to OpenAI instead")
-            logger.warning(f"Spoonacular provider requested but temporarily disabled, using OpenAI instead")
+            logger.warning("Spoonacular provider requested but temporarily disabled, using OpenAI instead")
             provider = "openai"
         
         api_key = None
@@ -234,30 +447,35 @@ async def recognize_product_from_image(
         elif provider == "spoonacular":
             api_key = settings.SPOONACULAR_API_KEY
         
-        print(f"🔧 Provider: {provider}")
-        print(f"🔑 API Key present: {api_key is not None and len(api_key) > 0 if api_key else False}")
-        logger.info(f"Using recognition provider: {provider} for user {current_user.id}")
-        
         if not api_key:
-            print(f"❌ ERROR: API key not configured for provider: {provider}")
-            logger.error(f"API key not configured for provider: {provider}")
+            logger.error("API key not configured for provider: %s", provider)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"API ключ для провайдера {provider} не настроен. Добавьте соответствующий ключ в настройки."
             )
         
         # Распознаем продукт
-        print(f"🚀 Starting recognition with provider: {provider}")
-        logger.info(f"Starting product recognition with provider: {provider}")
-        product_data = await recognize_product(
-            image_data=image_data,
-            provider=provider,
-            api_key=api_key
-        )
+        logger.info("Starting product recognition with provider: %s", provider)
+        # Уменьшаем изображение до отправки провайдеру (CPU-работа - в пуле потоков)
+        image_data = await asyncio.to_thread(_prepare_recognition_image_sync, image_data)
+        
+        # Запросы пользователя, пришедшие почти одновременно, объединяются
+        # в пакет (см. recognition_queue); изображения разных пользователей не смешиваются
+        try:
+            product_data = await recognition_queue.add_request(
+                image_data=image_data,
+                provider=provider,
+                api_key=api_key,
+                owner=current_user.id
+            )
+        except RecognitionQueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервис распознавания перегружен, попробуйте позже"
+            )
         
         if not product_data:
-            print(f"❌ Recognition FAILED for provider: {provider}")
-            logger.warning(f"Product recognition failed for provider: {provider}, user: {current_user.id}")
+            logger.warning("Product recognition failed for provider: %s, user: %s", provider, current_user.id)
             
             # Более информативное сообщение об ошибке
             error_detail = "Не удалось распознать продукт на изображении"
@@ -269,22 +487,21 @@ async def recognize_product_from_image(
                 detail=error_detail
             )
         
-        print(f"✅ Recognition SUCCESS by {provider}")
-        print(f"   Product: {product_data.get('name')}")
-        print(f"   Confidence: {product_data.get('confidence', 'unknown')}")
-        print(f"   Calories: {product_data.get('estimated_calories_per_100g')}")
-        print(f"   Proteins: {product_data.get('estimated_proteins_per_100g')}")
-        print(f"   Fats: {product_data.get('estimated_fats_per_100g')}")
-        print(f"   Carbs: {product_data.get('estimated_carbs_per_100g')}")
-        print(f"{'='*80}\n")
-        logger.info(f"Product recognized successfully by {provider}: '{product_data.get('name')}' (confidence: {product_data.get('confidence', 'unknown')}), user: {current_user.id}")
+        logger.info(
+            "Product recognized by %s: name=%s confidence=%s calories=%s user=%s",
+            provider,
+            product_data.get('name'),
+            product_data.get('confidence', 'unknown'),
+            product_data.get('estimated_calories_per_100g'),
+            current_user.id
+        )
         
         return product_data
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error recognizing product from image: {e}")
+        logger.error("Error recognizing product from image: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при распознавании продукта: {str(e)}"
@@ -301,8 +518,6 @@ async def lookup_barcode(
     Поиск продукта по штрихкоду
     Сначала ищет в локальной БД, если не находит - запрашивает из Open Food Facts
     """
-    import logging
-    logger = logging.getLogger(__name__)
     logger.info(f"Lookup barcode request: {request.barcode} from user {current_user.id}")
     
     # Ищем в локальной БД
@@ -313,12 +528,12 @@ async def lookup_barcode(
     
     if product:
         logger.info(f"Product found in local DB: {product.name} (ID: {product.id})")
-        return product
+        return model_response(FoodProductResponse, product)
     
     logger.info(f"Product not found in local DB, querying Open Food Facts for barcode: {request.barcode}")
     
     # Если не нашли в БД - запрашиваем из Open Food Facts
-    product_data = await get_product_by_barcode(request.barcode)
+    product_data = await cached_get_product_by_barcode(request.barcode)
     
     if not product_data:
         logger.warning(f"Product not found in Open Food Facts: {request.barcode}")
@@ -331,14 +546,13 @@ async def lookup_barcode(
     
     # Создаем новый продукт в БД
     try:
-        product = FoodProduct(**product_data)
-        db.add(product)
+        product = await _upsert_product_by_barcode(db, product_data)
         await db.commit()
-        await db.refresh(product)
+        _products_cache.clear()
         
         logger.info(f"Product created in DB: {product.name} (ID: {product.id})")
         
-        return product
+        return model_response(FoodProductResponse, product)
     except Exception as e:
         logger.error(f"Error creating product in DB: {e}")
         await db.rollback()
@@ -358,26 +572,23 @@ async def create_product_from_recognition(
     Создать продукт из распознавания (для обычных пользователей)
     Автоматически создает продукт с source='ai_recognition' и user_id
     """
-    # Проверяем, не существует ли уже такой продукт
-    result = await db.execute(
-        select(FoodProduct).where(FoodProduct.name == product_data.name)
-    )
-    existing = result.scalar_one_or_none()
-    
-    if existing:
-        return existing
-    
-    # Создаем новый продукт
+    # Создаем новый продукт, если продукта с таким названием еще нет (один запрос)
     product_dict = product_data.model_dump()
     product_dict['source'] = 'ai_recognition'
     product_dict['user_id'] = current_user.id
     
-    product = FoodProduct(**product_dict)
-    db.add(product)
-    await db.commit()
-    await db.refresh(product)
+    product = await _insert_product_if_name_free(db, product_dict)
     
-    return product
+    if product:
+        await db.commit()
+        _products_cache.clear()
+        return model_response(FoodProductResponse, product, status.HTTP_201_CREATED)
+    
+    # Продукт уже существует - возвращаем его
+    result = await db.execute(
+        select(FoodProduct).where(FoodProduct.name == product_data.name).limit(1)
+    )
+    return model_response(FoodProductResponse, result.scalar_one(), status.HTTP_201_CREATED)
 
 
 @router.post("/logs/from-barcode", response_model=NutritionLogResponse, status_code=status.HTTP_201_CREATED)
@@ -395,10 +606,11 @@ async def create_log_from_barcode(
         select(FoodProduct).where(FoodProduct.barcode == log_data.barcode)
     )
     product = result.scalar_one_or_none()
+    product_data = None
     
     # Если не нашли - запрашиваем из Open Food Facts
     if not product:
-        product_data = await get_product_by_barcode(log_data.barcode)
+        product_data = await cached_get_product_by_barcode(log_data.barcode)
         
         if not product_data:
             raise HTTPException(
@@ -406,44 +618,30 @@ async def create_log_from_barcode(
                 detail=f"Продукт со штрихкодом {log_data.barcode} не найден"
             )
         
-        # Создаем новый продукт
-        product = FoodProduct(**product_data)
-        db.add(product)
-        await db.commit()
-        await db.refresh(product)
-    
-    # Создаем запись в дневнике питания
-    nutrition_log = NutritionLog(
-        user_id=current_user.id,
-        product_id=product.id,
-        weight_g=log_data.weight_g,
-        eaten_at=log_data.eaten_at,
-        meal_type=log_data.meal_type,
-        notes=log_data.notes
-    )
+        # Создаем новый продукт (коммитится вместе с записью в дневнике)
+        product = await _upsert_product_by_barcode(db, product_data)
     
-    db.add(nutrition_log)
+    # Создаем запись в дневнике питания (INSERT ... RETURNING вместо add + refresh)
+    result = await db.execute(
+        insert(NutritionLog)
+        .values(
+            user_id=current_user.id,
+            product_id=product.id,
+            weight_g=log_data.weight_g,
+            eaten_at=log_data.eaten_at,
+            meal_type=log_data.meal_type,
+            notes=log_data.notes,
+            **_product_snapshot(product)
+        )
+        .returning(NutritionLog)
+    )
+    nutrition_log = result.scalar_one()
     await db.commit()
-    await db.refresh(nutrition_log)
+    if product_data:
+        _products_cache.clear()
     
     # Возвращаем с рассчитанными значениями
-    multiplier = nutrition_log.weight_g / 100.0
-    log_dict = {
-        "id": nutrition_log.id,
-        "user_id": nutrition_log.user_id,
-        "product_id": nutrition_log.product_id,
-        "weight_g": nutrition_log.weight_g,
-        "eaten_at": nutrition_log.eaten_at,
-        "meal_type": nutrition_log.meal_type,
-        "notes": nutrition_log.notes,
-        "calories": round(product.calories * multiplier, 2),
-        "proteins": round(product.proteins * multiplier, 2),
-        "fats": round(product.fats * multiplier, 2),
-        "carbs": round(product.carbs * multiplier, 2),
-        "product_name": product.name,
-    }
-    
-    return log_dict
+    return model_response(NutritionLogResponse, _log_response(nutrition_log), status.HTTP_201_CREATED)
 
 
 # ============ Дневник питания ============
@@ -453,56 +651,46 @@ async def get_nutrition_logs(
     from_date: date = None,
     to_date: date = None,
     meal_type: str = None,
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0, le=10000),
+    limit: int = Query(100, ge=1, le=200),
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Получить записи о питании с фильтрацией
+    
+    Для постраничной загрузки передавайте cursor и cursor_id из заголовков
+    X-Next-Cursor и X-Next-Cursor-Id предыдущей страницы (skip при этом не нужен)
     """
-    # Используем join для оптимизации запросов
-    query = (
-        select(NutritionLog, FoodProduct)
-        .join(FoodProduct, NutritionLog.product_id == FoodProduct.id)
-        .where(NutritionLog.user_id == current_user.id)
-    )
+    # КБЖУ и название продукта хранятся в самой записи, JOIN не нужен
+    query = select(NutritionLog).where(NutritionLog.user_id == current_user.id)
     
+    # Полуоткрытый диапазон [from_date, to_date + 1 день) по самой колонке,
+    # чтобы использовался индекс (user_id, eaten_at DESC)
     if from_date:
-        query = query.where(func.date(NutritionLog.eaten_at) >= from_date)
+        query = query.where(NutritionLog.eaten_at >= datetime.combine(from_date, time.min))
     
     if to_date:
-        query = query.where(func.date(NutritionLog.eaten_at) <= to_date)
+        query = query.where(NutritionLog.eaten_at < datetime.combine(to_date + timedelta(days=1), time.min))
     
     if meal_type:
         query = query.where(NutritionLog.meal_type == meal_type)
     
-    query = query.order_by(NutritionLog.eaten_at.desc()).offset(skip).limit(limit)
+    if cursor and cursor_id:
+        query = query.where(tuple_(NutritionLog.eaten_at, NutritionLog.id) < tuple_(cursor, cursor_id))
+    
+    query = query.order_by(NutritionLog.eaten_at.desc(), NutritionLog.id.desc()).offset(skip).limit(limit)
     
     result = await db.execute(query)
-    rows = result.all()
-    
-    enriched_logs = []
-    for log, product in rows:
-            # Рассчитываем на основе веса порции
-            multiplier = log.weight_g / 100.0
-            log_dict = {
-                "id": log.id,
-                "user_id": log.user_id,
-                "product_id": log.product_id,
-                "weight_g": log.weight_g,
-                "eaten_at": log.eaten_at,
-                "meal_type": log.meal_type,
-                "notes": log.notes,
-                "calories": round(product.calories * multiplier, 2),
-                "proteins": round(product.proteins * multiplier, 2),
-                "fats": round(product.fats * multiplier, 2),
-                "carbs": round(product.carbs * multiplier, 2),
-            "product_name": product.name,  # Добавляем название продукта
-            }
-            enriched_logs.append(log_dict)
+    enriched_logs = [_log_response(log) for log in result.scalars()]
     
-    return enriched_logs
+    response = await model_list_response_async(NutritionLogResponse, enriched_logs)
+    if len(enriched_logs) == limit:
+        response.headers["X-Next-Cursor"] = enriched_logs[-1]["eaten_at"].isoformat()
+        response.headers["X-Next-Cursor-Id"] = str(enriched_logs[-1]["id"])
+    return response
 
 
 @router.post("/logs", response_model=NutritionLogResponse, status_code=status.HTTP_201_CREATED)
@@ -526,33 +714,21 @@ async def create_nutrition_log(
             detail="Продукт не найден"
         )
     
-    log = NutritionLog(
-        user_id=current_user.id,
-        **log_data.model_dump()
+    # INSERT ... RETURNING вместо add + refresh
+    result = await db.execute(
+        insert(NutritionLog)
+        .values(
+            user_id=current_user.id,
+            **log_data.model_dump(),
+            **_product_snapshot(product)
+        )
+        .returning(NutritionLog)
     )
-    
-    db.add(log)
+    log = result.scalar_one()
     await db.commit()
-    await db.refresh(log)
     
     # Возвращаем с рассчитанными значениями
-    multiplier = log.weight_g / 100.0
-    log_dict = {
-        "id": log.id,
-        "user_id": log.user_id,
-        "product_id": log.product_id,
-        "weight_g": log.weight_g,
-        "eaten_at": log.eaten_at,
-        "meal_type": log.meal_type,
-        "notes": log.notes,
-        "calories": round(product.calories * multiplier, 2),
-        "proteins": round(product.proteins * multiplier, 2),
-        "fats": round(product.fats * multiplier, 2),
-        "carbs": round(product.carbs * multiplier, 2),
-        "product_name": product.name,  # Добавляем название продукта
-    }
-    
-    return log_dict
+    return model_response(NutritionLogResponse, _log_response(log), status.HTTP_201_CREATED)
 
 
 @router.put("/logs/{log_id}", response_model=NutritionLogResponse)
@@ -580,55 +756,26 @@ async def update_nutrition_log(
     # Обновляем только переданные поля
     update_data = log_data.model_dump(exclude_unset=True)
     
-    # Если меняется продукт, проверяем его существование
-    if 'product_id' in update_data:
-        product_result = await db.execute(
-            select(FoodProduct).where(FoodProduct.id == update_data['product_id'])
-        )
-        product = product_result.scalar_one_or_none()
+    # Если меняется продукт, проверяем его существование и обновляем снимок КБЖУ
+    if 'product_id' in update_data and update_data['product_id'] != log.product_id:
+        product = await db.get(FoodProduct, update_data['product_id'])
         
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Продукт не найден"
             )
+        
+        update_data.update(_product_snapshot(product))
     
     for field, value in update_data.items():
         setattr(log, field, value)
     
+    # expire_on_commit=False: атрибуты log остаются актуальными, refresh не нужен
     await db.commit()
-    await db.refresh(log)
-    
-    # Загружаем продукт для расчета калорий и БЖУ
-    product_result = await db.execute(
-        select(FoodProduct).where(FoodProduct.id == log.product_id)
-    )
-    product = product_result.scalar_one_or_none()
-    
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Ошибка при загрузке продукта"
-        )
     
     # Возвращаем с рассчитанными значениями
-    multiplier = log.weight_g / 100.0
-    log_dict = {
-        "id": log.id,
-        "user_id": log.user_id,
-        "product_id": log.product_id,
-        "weight_g": log.weight_g,
-        "eaten_at": log.eaten_at,
-        "meal_type": log.meal_type,
-        "notes": log.notes,
-        "calories": round(product.calories * multiplier, 2),
-        "proteins": round(product.proteins * multiplier, 2),
-        "fats": round(product.fats * multiplier, 2),
-        "carbs": round(product.carbs * multiplier, 2),
-        "product_name": product.name,
-    }
-    
-    return log_dict
+    return model_response(NutritionLogResponse, _log_response(log))
 
 
 @router.delete("/logs/{log_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -668,46 +815,36 @@ async def get_daily_summary(
     Получить итоговую статистику питания за день
     """
     if not target_date:
-        target_date = date.today()
+        target_date = utc_today()
     
-    # Получаем все записи за день
+    day_start = datetime.combine(target_date, time.min)
+    
+    # Сумма КБЖУ и количество приемов пищи одним агрегирующим запросом по nutrition_logs
+    multiplier = NutritionLog.weight_g / 100.0
     result = await db.execute(
-        select(NutritionLog)
+        select(
+            func.coalesce(func.sum(NutritionLog.calories_per_100g * multiplier), 0).label("calories"),
+            func.coalesce(func.sum(NutritionLog.proteins_per_100g * multiplier), 0).label("proteins"),
+            func.coalesce(func.sum(NutritionLog.fats_per_100g * multiplier), 0).label("fats"),
+            func.coalesce(func.sum(NutritionLog.carbs_per_100g * multiplier), 0).label("carbs"),
+            func.count(NutritionLog.id).label("meals_count"),
+        )
         .where(
             NutritionLog.user_id == current_user.id,
-            func.date(NutritionLog.eaten_at) == target_date
+            NutritionLog.eaten_at >= day_start,
+            NutritionLog.eaten_at < day_start + timedelta(days=1)
         )
     )
-    logs = result.scalars().all()
-    
-    # Рассчитываем суммарные значения
-    total_calories = 0.0
-    total_proteins = 0.0
-    total_fats = 0.0
-    total_carbs = 0.0
-    
-    for log in logs:
-        # Загружаем продукт
-        product_result = await db.execute(
-            select(FoodProduct).where(FoodProduct.id == log.product_id)
-        )
-        product = product_result.scalar_one_or_none()
-        
-        if product:
-            multiplier = log.weight_g / 100.0
-            total_calories += product.calories * multiplier
-            total_proteins += product.proteins * multiplier
-            total_fats += product.fats * multiplier
-            total_carbs += product.carbs * multiplier
+    totals = result.one()
     
-    return {
+    return model_response(DailyNutritionSummary, {
         "date": target_date.isoformat(),
-        "total_calories": round(total_calories, 2),
-        "total_proteins": round(total_proteins, 2),
-        "total_fats": round(total_fats, 2),
-        "total_carbs": round(total_carbs, 2),
-        "meals_count": len(logs)
-    }
+        "total_calories": round(totals.calories, 2),
+        "total_proteins": round(totals.proteins, 2),
+        "total_fats": round(totals.fats, 2),
+        "total_carbs": round(totals.carbs, 2),
+        "meals_count": totals.meals_count
+    })
 
 
 # ============ Гидратация ============
@@ -725,17 +862,17 @@ async def log_hydration(
     """
     Записать выпитую воду
     """
-    from app.models.nutrition import HydrationLog
-    
-    log = HydrationLog(
-        user_id=current_user.id,
-        amount_ml=request.amount_ml,
-        logged_at=datetime.utcnow()
+    result = await db.execute(
+        insert(HydrationLog)
+        .values(
+            user_id=current_user.id,
+            amount_ml=request.amount_ml,
+            logged_at=datetime.now(timezone.utc).replace(tzinfo=None)
+        )
+        .returning(HydrationLog)
     )
-    
-    db.add(log)
+    log = result.scalar_one()
     await db.commit()
-    await db.refresh(log)
     
     return {"id": str(log.id), "amount_ml": log.amount_ml, "logged_at": log.logged_at}
 
@@ -748,40 +885,34 @@ async def get_today_hydration(
     """
     Получить количество воды за сегодня
     """
-    from app.models.nutrition import HydrationLog
-    from datetime import datetime, timedelta
-    from sqlalchemy import desc
-    
     # Используем UTC для консистентности с log_hydration
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_start = datetime.combine(utc_today(), time.min)
     
-    result = await db.execute(
-        select(func.sum(HydrationLog.amount_ml))
+    # Выпитое за сегодня и последний вес - два скалярных подзапроса в одном запросе
+    total_ml_subquery = (
+        select(func.coalesce(func.sum(HydrationLog.amount_ml), 0))
         .where(HydrationLog.user_id == current_user.id)
         .where(HydrationLog.logged_at >= today_start)
+        .scalar_subquery()
     )
-    total_ml = result.scalar() or 0
-    
-    # Рекомендуемая норма (упрощенно: 30мл на кг веса)
-    profile_result = await db.execute(
-        select(UserProfile).where(UserProfile.user_id == current_user.id)
+    weight_subquery = (
+        select(BodyMetric.weight)
+        .where(BodyMetric.user_id == current_user.id)
+        .where(BodyMetric.weight.isnot(None))
+        .order_by(BodyMetric.date.desc(), BodyMetric.id.desc())
+        .limit(1)
+        .scalar_subquery()
     )
-    profile = profile_result.scalar_one_or_none()
+    result = await db.execute(
+        select(total_ml_subquery.label("total_ml"), weight_subquery.label("weight"))
+    )
+    row = result.one()
+    total_ml = row.total_ml
     
+    # Рекомендуемая норма (упрощенно: 30мл на кг веса)
     recommended_ml = 2000  # По умолчанию
-    if profile:
-        from app.models.metrics import BodyMetric
-        weight_result = await db.execute(
-            select(BodyMetric)
-            .where(BodyMetric.user_id == current_user.id)
-            .where(BodyMetric.weight.isnot(None))
-            .order_by(desc(BodyMetric.date))
-            .limit(1)
-        )
-        weight_metric = weight_result.scalar_one_or_none()
-        
-        if weight_metric and weight_metric.weight:
-            recommended_ml = weight_metric.weight * 30  # 30мл на кг
+    if row.weight:
+        recommended_ml = row.weight * 30  # 30мл на кг
     
     return {
         "total_ml": round(total_ml, 1),
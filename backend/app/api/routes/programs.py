@@ -1,17 +1,22 @@
 """
 API роутер для тренировочных программ
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from collections import defaultdict
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, delete
-from sqlalchemy.orm import selectinload
-from typing import List
+from sqlalchemy import select, insert, or_, delete, update, tuple_
+from sqlalchemy.orm import selectinload, raiseload
+from typing import List, Optional
+from datetime import datetime
 from uuid import UUID
 
 from app.db.database import get_db
+from app.db.functions import utc_now
 from app.core.dependencies import get_current_active_user, require_admin
+from app.core.cache import TTLCache
+from app.core.responses import model_response, model_list_response_async, cached_json_response
 from app.models.program import Program, ProgramDetail
-from app.models.user import User
+from app.models.user import User, UserProfile
 from app.schemas.program import (
     ProgramCreate,
     ProgramUpdate,
@@ -22,14 +27,158 @@ from app.schemas.program import (
 
 router = APIRouter()
 
+# Кэш готовых ответов списка программ (ключ - параметры запроса),
+# сбрасывается при изменении программ в этом воркере
+_programs_cache = TTLCache(maxsize=1024, ttl=60)
+
+
+def _paginate_programs(query, skip: int, limit: int, cursor: Optional[datetime], cursor_id: Optional[UUID]):
+    """
+    Keyset пагинация по (created_at, id) от новых к старым
+    """
+    if cursor and cursor_id:
+        # Сравнение кортежей использует индекс (created_at DESC, id DESC)
+        query = query.where(tuple_(Program.created_at, Program.id) < tuple_(cursor, cursor_id))
+    return query.order_by(Program.created_at.desc(), Program.id.desc()).offset(skip).limit(limit)
+
+
+def _program_list_query():
+    """
+    Колонки программы и автора одним запросом (JOIN users и user_profiles),
+    без ORM объектов и отдельного запроса профилей авторов
+    """
+    return (
+        select(
+            *Program.__table__.columns,
+            User.email.label("author_email"),
+            UserProfile.full_name.label("author_full_name")
+        )
+        .join(User, User.id == Program.author_id)
+        .outerjoin(UserProfile, UserProfile.user_id == Program.author_id)
+    )
+
+
+def _author_data(author_id: UUID, author_email: Optional[str], author_full_name: Optional[str]) -> dict:
+    return {
+        "id": author_id,
+        "email": author_email,
+        "profile": {"full_name": author_full_name} if author_full_name is not None else None,
+    }
+
+
+def _program_rows(result) -> List[dict]:
+    """
+    Строки _program_list_query в виде данных ProgramResponse
+    """
+    programs = []
+    for row in result.mappings():
+        data = dict(row)
+        data["author"] = _author_data(
+            data["author_id"], data.pop("author_email"), data.pop("author_full_name")
+        )
+        programs.append(data)
+    return programs
+
+
+async def _program_page_response(programs: List[dict], limit: int):
+    """
+    Ответ со списком программ и курсором следующей страницы в заголовках
+    """
+    response = await model_list_response_async(ProgramResponse, programs)
+    if len(programs) == limit:
+        response.headers["X-Next-Cursor"] = programs[-1]["created_at"].isoformat()
+        response.headers["X-Next-Cursor-Id"] = str(programs[-1]["id"])
+    return response
+
+
+def _program_with_author(program: Program, author_email: Optional[str], author_full_name: Optional[str]) -> dict:
+    """
+    Данные ответа ProgramResponse с автором, собранные без загрузки связей
+    """
+    data = {field: getattr(program, field) for field in ProgramResponse.model_fields if field != "author"}
+    data["author"] = _author_data(program.author_id, author_email, author_full_name)
+    return data
+
+
+async def _raise_program_access_error(db: AsyncSession, program_id: UUID, forbidden_detail: str) -> None:
+    """
+    UPDATE/DELETE с проверкой прав в WHERE не затронул строк:
+    различаем "нет программы" (404) и "нет прав" (403)
+    """
+    exists = await db.scalar(select(select(Program.id).where(Program.id == program_id).exists()))
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Программа не найдена"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=forbidden_detail
+    )
+
+
+async def _merge_program_details(db: AsyncSession, program_id: UUID, details: List[dict]) -> None:
+    """
+    Приводит детали программы к переданному списку, меняя только отличающиеся строки
+    
+    Детали сопоставляются по (day_number, exercise_id); одинаковые упражнения
+    в один день сопоставляются по порядку. Совпавшие строки сохраняют свой id,
+    неизменные не трогаются, остальные добавляются/удаляются пакетно
+    """
+    result = await db.execute(
+        select(ProgramDetail)
+        .where(ProgramDetail.program_id == program_id)
+        .order_by(ProgramDetail.order, ProgramDetail.id)
+    )
+    existing = defaultdict(list)
+    for detail in result.scalars():
+        existing[(detail.day_number, detail.exercise_id)].append(detail)
+    
+    to_insert, to_update = [], []
+    for detail_data in details:
+        matches = existing.get((detail_data["day_number"], detail_data["exercise_id"]))
+        if not matches:
+            to_insert.append({"program_id": program_id, **detail_data})
+            continue
+        
+        detail = matches.pop(0)
+        changes = {
+            field: value for field, value in detail_data.items()
+            if getattr(detail, field) != value
+        }
+        if changes:
+            to_update.append({"id": detail.id, **changes})
+    
+    to_delete = [detail.id for matches in existing.values() for detail in matches]
+    
+    if to_delete:
+        await db.execute(
+            delete(ProgramDetail)
+            .where(ProgramDetail.id.in_(to_delete))
+            .execution_options(synchronize_session=False)
+        )
+    for changes in to_update:
+        await db.execute(
+            update(ProgramDetail)
+            .where(ProgramDetail.id == changes.pop("id"))
+            .values(**changes)
+            .execution_options(synchronize_session=False)
+        )
+    if to_insert:
+        # Пакетный INSERT: один executemany вместо INSERT на каждую строку
+        await db.execute(insert(ProgramDetail), to_insert)
+
 
 @router.get("/", response_model=List[ProgramResponse])
 async def list_programs(
-    skip: int = 0,
-    limit: int = 50,
+    skip: int = Query(0, ge=0, le=10000),
+    limit: int = Query(50, ge=1, le=200),
     difficulty: str = None,
     muscle_group: str = None,
     public_only: bool = True,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[UUID] = None,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -38,10 +187,24 @@ async def list_programs(
     - public_only=True: только публичные программы
     - public_only=False: публичные + свои личные программы
     - muscle_group: фильтр по группе мышц (поиск подстроки)
+    
+    Для постраничной загрузки передавайте cursor и cursor_id из заголовков
+    X-Next-Cursor и X-Next-Cursor-Id предыдущей страницы (skip при этом не нужен)
+    
+    Ответ содержит ETag: при совпадении If-None-Match возвращается 304
     """
-    query = select(Program).options(
-        selectinload(Program.author).selectinload(User.profile)
+    # Список публичных программ одинаков для всех пользователей,
+    # с личными программами - ключ включает пользователя
+    cache_key = (
+        skip, limit, difficulty, muscle_group, public_only, cursor, cursor_id,
+        None if public_only else current_user.id
     )
+    cached = _programs_cache.get(cache_key)
+    if cached is not None:
+        body, headers = cached
+        return cached_json_response(body, if_none_match, headers)
+    
+    query = _program_list_query()
     
     if public_only:
         query = query.where(Program.is_public == True)
@@ -58,15 +221,18 @@ async def list_programs(
         query = query.where(Program.difficulty == difficulty)
         
     if muscle_group:
-        # Используем ilike для поиска без учета регистра
+        # ilike без учета регистра; подстрочный поиск обслуживает триграммный GIN индекс
         query = query.where(Program.target_muscle_groups.ilike(f"%{muscle_group}%"))
     
-    query = query.offset(skip).limit(limit).order_by(Program.created_at.desc())
+    query = _paginate_programs(query, skip, limit, cursor, cursor_id)
     
     result = await db.execute(query)
-    programs = result.scalars().all()
+    programs = _program_rows(result)
     
-    return programs
+    response = await _program_page_response(programs, limit)
+    headers = {key: response.headers[key] for key in ("X-Next-Cursor", "X-Next-Cursor-Id") if key in response.headers}
+    _programs_cache.set(cache_key, (response.body, headers))
+    return cached_json_response(response.body, if_none_match, headers)
 
 
 @router.get("/{program_id}", response_model=ProgramWithDetails)
@@ -82,7 +248,9 @@ async def get_program(
         select(Program)
         .options(
             selectinload(Program.details),
-            selectinload(Program.author).selectinload(User.profile)
+            selectinload(Program.author).selectinload(User.profile),
+            # Остальные связи не загружаются неявно: обращение к ним - ошибка, а не N+1
+            raiseload('*')
         )
         .where(Program.id == program_id)
     )
@@ -101,7 +269,7 @@ async def get_program(
             detail="Доступ к этой программе запрещен"
         )
     
-    return program
+    return model_response(ProgramWithDetails, program)
 
 
 @router.post("/", response_model=ProgramResponse, status_code=status.HTTP_201_CREATED)
@@ -113,38 +281,36 @@ async def create_program(
     """
     Создать новую программу
     """
-    # Создаем программу
+    # Создаем программу: INSERT ... RETURNING вместе с именем автора из профиля,
+    # автор - текущий пользователь, поэтому повторный SELECT для ответа не нужен
     program_dict = program_data.model_dump(exclude={"details"})
-    program = Program(
-        **program_dict,
-        author_id=current_user.id
+    author_full_name = (
+        select(UserProfile.full_name)
+        .where(UserProfile.user_id == current_user.id)
+        .scalar_subquery()
     )
+    result = await db.execute(
+        insert(Program)
+        .values(**program_dict, author_id=current_user.id)
+        .returning(Program, author_full_name)
+    )
+    program, full_name = result.one()
     
-    db.add(program)
-    await db.flush()
-    
-    # Добавляем детали программы
+    # Добавляем детали программы одним пакетным INSERT (executemany)
     if program_data.details:
-        for detail_data in program_data.details:
-            detail = ProgramDetail(
-                program_id=program.id,
-                **detail_data.model_dump()
-            )
-            db.add(detail)
+        await db.execute(
+            insert(ProgramDetail),
+            [{"program_id": program.id, **detail_data.model_dump()} for detail_data in program_data.details]
+        )
     
     await db.commit()
+    _programs_cache.clear()
     
-    # Перезагружаем программу с необходимыми связями для сериализации
-    result = await db.execute(
-        select(Program)
-        .options(
-            selectinload(Program.author).selectinload(User.profile)
-        )
-        .where(Program.id == program.id)
+    return model_response(
+        ProgramResponse,
+        _program_with_author(program, current_user.email, full_name),
+        status.HTTP_201_CREATED
     )
-    program = result.scalar_one()
-    
-    return program
 
 
 @router.put("/{program_id}", response_model=ProgramResponse)
@@ -157,57 +323,44 @@ async def update_program(
     """
     Обновить программу
     """
-    result = await db.execute(select(Program).where(Program.id == program_id))
-    program = result.scalar_one_or_none()
+    update_data = program_data.model_dump(exclude_unset=True)
+    details_set = "details" in update_data
+    details = update_data.pop("details", None)
     
-    if not program:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Программа не найдена"
-        )
+    # Проверка прав в WHERE: изменение и проверка - один запрос, без гонки между ними.
+    # Программа обновляется всегда (хотя бы updated_at), даже если меняются только детали;
+    # RETURNING сразу отдает строку и автора для ответа
+    stmt = update(Program).where(Program.id == program_id)
+    if current_user.role.value != "admin":
+        stmt = stmt.where(Program.author_id == current_user.id)
     
-    # Проверяем права на редактирование
-    if program.author_id != current_user.id and current_user.role.value != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Вы не можете редактировать эту программу"
-        )
+    author_email = select(User.email).where(User.id == Program.author_id).scalar_subquery()
+    author_full_name = (
+        select(UserProfile.full_name)
+        .where(UserProfile.user_id == Program.author_id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        stmt.values(**(update_data or {"updated_at": utc_now()}))
+        .returning(Program, author_email, author_full_name)
+    )
+    row = result.one_or_none()
+    
+    if row is None:
+        await _raise_program_access_error(db, program_id, "Вы не можете редактировать эту программу")
+    program, email, full_name = row
     
-    # Обновляем поля
-    update_data = program_data.model_dump(exclude_unset=True)
-
     # Если переданы детали, обновляем их
-    if "details" in update_data:
-        details = update_data.pop("details")
-        
-        # Удаляем текущие детали
-        await db.execute(delete(ProgramDetail).where(ProgramDetail.program_id == program_id))
-        
-        # Добавляем новые
-        if details:
-            for detail_data in details:
-                detail = ProgramDetail(
-                    program_id=program_id,
-                    **detail_data
-                )
-                db.add(detail)
-
-    for field, value in update_data.items():
-        setattr(program, field, value)
+    if details_set:
+        await _merge_program_details(db, program_id, details or [])
     
     await db.commit()
+    _programs_cache.clear()
     
-    # Перезагружаем программу с необходимыми связями для сериализации
-    result = await db.execute(
-        select(Program)
-        .options(
-            selectinload(Program.author).selectinload(User.profile)
-        )
-        .where(Program.id == program_id)
+    return model_response(
+        ProgramResponse,
+        _program_with_author(program, email, full_name)
     )
-    program = result.scalar_one()
-    
-    return program
 
 
 @router.delete("/{program_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -219,49 +372,41 @@ async def delete_program(
     """
     Удалить программу
     """
-    result = await db.execute(select(Program).where(Program.id == program_id))
-    program = result.scalar_one_or_none()
+    # Проверка прав в WHERE: удаление и проверка - один запрос
+    # (детали, история и статусы программы удаляются каскадом на стороне БД)
+    stmt = delete(Program).where(Program.id == program_id)
+    if current_user.role.value != "admin":
+        stmt = stmt.where(Program.author_id == current_user.id)
     
-    if not program:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Программа не найдена"
-        )
+    result = await db.execute(
+        stmt.returning(Program.id).execution_options(synchronize_session=False)
+    )
     
-    # Проверяем права на удаление
-    if program.author_id != current_user.id and current_user.role.value != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Вы не можете удалить эту программу"
-        )
+    if result.scalar_one_or_none() is None:
+        await _raise_program_access_error(db, program_id, "Вы не можете удалить эту программу")
     
-    await db.delete(program)
     await db.commit()
+    _programs_cache.clear()
     
     return None
 
 
 @router.get("/my/programs", response_model=List[ProgramResponse])
 async def get_my_programs(
-    skip: int = 0,
-    limit: int = 50,
+    skip: int = Query(0, ge=0, le=10000),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Получить свои программы
+    
+    Постраничная загрузка - как в списке программ (cursor и cursor_id)
     """
-    result = await db.execute(
-        select(Program)
-        .options(
-            selectinload(Program.author).selectinload(User.profile)
-        )
-        .where(Program.author_id == current_user.id)
-        .offset(skip)
-        .limit(limit)
-        .order_by(Program.created_at.desc())
-    )
-    programs = result.scalars().all()
+    query = _program_list_query().where(Program.author_id == current_user.id)
+    result = await db.execute(_paginate_programs(query, skip, limit, cursor, cursor_id))
+    programs = _program_rows(result)
     
-    return programs
-
+    return await _program_page_response(programs, limit)
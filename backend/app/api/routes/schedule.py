@@ -1,16 +1,20 @@
 """
 API роутер для расписания и трекинга тренировок
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, and_, update, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, desc, and_, update, func, tuple_, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload, raiseload
 from typing import List, Optional
-from datetime import datetime, date, timedelta
+from datetime import datetime
 from uuid import UUID
 
-from app.db.database import get_db
+from app.db.database import get_db, get_db_with_commit
+from app.db.functions import typed_row, utc_now, utc_today
 from app.core.dependencies import get_current_active_user
+from app.core.responses import model_response, model_list_response_async
 from app.models.user import User, UserProfile
 from app.models.program import Program, WorkoutLog
 from app.models.user_program import UserProgram, ProgramStatus
@@ -18,75 +22,86 @@ from app.schemas.program import WorkoutLogCreate, WorkoutLogResponse, ProgramWit
 
 router = APIRouter()
 
+
 @router.post("/start/{program_id}", status_code=status.HTTP_200_OK)
 async def start_program(
     program_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_with_commit, scope="function"),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Начать выполнение программы (сделать её текущей)
-    """
-    # 1. Проверяем существование программы
-    result = await db.execute(select(Program).where(Program.id == program_id))
-    program = result.scalar_one_or_none()
     
-    if not program:
-        raise HTTPException(status_code=404, detail="Программа не найдена")
+    Все шаги выполняются одним запросом (WITH ... INSERT ... ON CONFLICT):
+    деактивация текущей программы, upsert UserProgram и профиля.
+    Если программы нет, ни один из шагов ничего не меняет
+    """
+    now = utc_now()
+    program_exists = select(Program.id).where(Program.id == program_id).exists()
     
-    # 2. Деактивируем текущую активную программу пользователя
-    await db.execute(
+    # 1. Деактивируем текущую активную программу пользователя
+    deactivated = (
         update(UserProgram)
         .where(
-            and_(
-                UserProgram.user_id == current_user.id,
-                UserProgram.is_active == True
-            )
+            UserProgram.user_id == current_user.id,
+            UserProgram.is_active == True,
+            UserProgram.program_id != program_id,
+            program_exists
         )
         .values(is_active=False)
+        .returning(UserProgram.id)
+        .cte("deactivated")
     )
     
-    # 3. Ищем или создаем запись для новой программы
-    stmt = select(UserProgram).where(
-        and_(
-            UserProgram.user_id == current_user.id,
-            UserProgram.program_id == program_id
-        )
+    # 2. Обновляем профиль пользователя для backward compatibility (пока не удалим поле)
+    profile_values = {
+        "user_id": current_user.id,
+        "current_program_id": program_id,
+        "current_program_start_date": utc_today(),
+    }
+    profile_stmt = pg_insert(UserProfile).from_select(
+        list(profile_values),
+        typed_row(UserProfile, profile_values).where(program_exists)
     )
-    result = await db.execute(stmt)
-    user_program = result.scalar_one_or_none()
+    profile_upserted = profile_stmt.on_conflict_do_update(
+        index_elements=[UserProfile.user_id],
+        set_={
+            "current_program_id": profile_stmt.excluded.current_program_id,
+            "current_program_start_date": profile_stmt.excluded.current_program_start_date,
+        }
+    ).returning(UserProfile.user_id).cte("profile_upserted")
     
-    if user_program:
-        # Обновляем существующую
-        user_program.is_active = True
-        user_program.status = ProgramStatus.STARTED
-        user_program.last_interaction_at = datetime.utcnow()
-        if not user_program.start_date:
-            user_program.start_date = datetime.utcnow()
-    else:
-        # Создаем новую
-        user_program = UserProgram(
-            user_id=current_user.id,
-            program_id=program_id,
-            status=ProgramStatus.STARTED,
-            is_active=True,
-            start_date=datetime.utcnow()
+    # 3. Создаем запись для новой программы или активируем существующую
+    # start_date и last_interaction_at заполняются значениями по умолчанию (utc_now)
+    user_program_values = {
+        "id": uuid.uuid4(),
+        "user_id": current_user.id,
+        "program_id": program_id,
+        "status": ProgramStatus.STARTED,
+        "is_active": True,
+    }
+    user_program_stmt = pg_insert(UserProgram).from_select(
+        list(user_program_values),
+        typed_row(UserProgram, user_program_values).where(program_exists)
+    )
+    user_program_stmt = (
+        user_program_stmt.on_conflict_do_update(
+            index_elements=[UserProgram.user_id, UserProgram.program_id],
+            set_={
+                "is_active": True,
+                "status": ProgramStatus.STARTED,
+                "last_interaction_at": now,
+                "start_date": func.coalesce(UserProgram.start_date, now),
+            }
         )
-        db.add(user_program)
-    
-    # 4. Обновляем профиль пользователя для backward compatibility (пока не удалим поле)
-    stmt = select(UserProfile).where(UserProfile.user_id == current_user.id)
-    result = await db.execute(stmt)
-    profile = result.scalar_one_or_none()
-    
-    if not profile:
-        profile = UserProfile(user_id=current_user.id)
-        db.add(profile)
+        .returning(UserProgram.id)
+        .add_cte(deactivated, profile_upserted)
+    )
     
-    profile.current_program_id = program_id
-    profile.current_program_start_date = date.today()
+    result = await db.execute(user_program_stmt)
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Программа не найдена")
     
-    await db.commit()
     return {"message": "Программа успешно начата"}
 
 
@@ -116,12 +131,16 @@ async def get_active_program(
         select(Program)
         .options(
             selectinload(Program.details),
-            selectinload(Program.author).selectinload(User.profile)
+            selectinload(Program.author).selectinload(User.profile),
+            # Остальные связи не загружаются неявно: обращение к ним - ошибка, а не N+1
+            raiseload('*')
         )
         .where(Program.id == active_up.program_id)
     )
     program = result.scalar_one_or_none()
-    return program
+    if program is None:
+        return None
+    return model_response(ProgramWithDetails, program)
 
 
 @router.get("/status")
@@ -132,30 +151,55 @@ async def get_schedule_status(
     """
     Получить статус текущего расписания с расчетом прогресса по выполненным тренировкам
     """
-    # 1. Получаем активную программу
-    stmt = select(UserProgram).where(
-        and_(
+    # completed_at хранится в UTC (utc_now), и дневной уникальный индекс
+    # считает date(completed_at) в UTC - "сегодня" берем в той же зоне
+    today = utc_today()
+    
+    # Один запрос: активная программа, число выполненных тренировок
+    # и признак тренировки за сегодня (подзапросы по индексам workout_logs)
+    active = (
+        select(UserProgram.program_id, UserProgram.start_date)
+        .where(
             UserProgram.user_id == current_user.id,
             UserProgram.is_active == True
         )
+        .limit(1)
+        .cte("active")
     )
-    result = await db.execute(stmt)
-    active_up = result.scalar_one_or_none()
+    completed_count = (
+        select(func.count())
+        .select_from(WorkoutLog)
+        .where(
+            WorkoutLog.user_id == current_user.id,
+            WorkoutLog.program_id == active.c.program_id
+        )
+        .scalar_subquery()
+    )
+    # Равенство по date(completed_at) обслуживает индекс ux_workout_logs_user_program_day
+    completed_today = (
+        select(WorkoutLog.id)
+        .where(
+            WorkoutLog.user_id == current_user.id,
+            WorkoutLog.program_id == active.c.program_id,
+            func.date(WorkoutLog.completed_at) == today
+        )
+        .exists()
+    )
+    result = await db.execute(
+        select(
+            active.c.start_date,
+            completed_count.label("completed_workouts"),
+            completed_today.label("is_completed_today")
+        )
+    )
+    active_up = result.one_or_none()
     
     if not active_up:
         return None
     
-    # 2. Считаем количество выполненных тренировок для этой программы
-    log_count_stmt = select(func.count(WorkoutLog.id)).where(
-        and_(
-            WorkoutLog.user_id == current_user.id,
-            WorkoutLog.program_id == active_up.program_id
-        )
-    )
-    result = await db.execute(log_count_stmt)
-    completed_workouts_count = result.scalar() or 0
+    completed_workouts_count = active_up.completed_workouts or 0
     
-    # 3. Определяем текущую неделю и день на основе количества выполненных
+    # Определяем текущую неделю и день на основе количества выполненных
     # Формула: мы начинаем с 1-й тренировки. Если выполнено 0, то мы на 1-й. Если выполнено 5, мы на 6-й.
     current_workout_number = completed_workouts_count + 1
     
@@ -173,29 +217,13 @@ async def get_schedule_status(
     current_week = (completed_workouts_count // 7) + 1
     
     # Для отображения "сегодняшнего" дня недели (Пн, Вт...) оставляем календарный день
-    today = date.today()
     current_day_of_week = today.isoweekday()
     
-    # 4. Проверяем, выполнена ли тренировка СЕГОДНЯ
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
-    
-    todays_log_stmt = select(WorkoutLog).where(
-        and_(
-            WorkoutLog.user_id == current_user.id,
-            WorkoutLog.program_id == active_up.program_id,
-            WorkoutLog.completed_at >= start_of_day,
-            WorkoutLog.completed_at <= end_of_day
-        )
-    )
-    result = await db.execute(todays_log_stmt)
-    todays_log = result.scalars().first()
-    
     return {
         "current_week": current_week,          # Расчетная неделя (1, 2...)
         "current_day_of_week": current_day_of_week, # 1=Пн, 7=Вс
         "completed_workouts": completed_workouts_count, # Всего выполнено
-        "is_completed_today": todays_log is not None,
+        "is_completed_today": active_up.is_completed_today,
         "start_date": active_up.start_date
     }
 
@@ -203,113 +231,103 @@ async def get_schedule_status(
 @router.post("/log", response_model=WorkoutLogResponse)
 async def log_workout(
     log_data: WorkoutLogCreate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_with_commit, scope="function"),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Записать выполненную тренировку
+    
+    Одна запись на программу в день: повторная запись за тот же день обновляет
+    длительность и заметки. Запись и обновление UserProgram выполняются одним
+    запросом (WITH ... INSERT ... ON CONFLICT)
     """
-    # Check if already logged today for this program
-    today = date.today()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
-
-    existing_log_stmt = select(WorkoutLog).where(
-        and_(
-            WorkoutLog.user_id == current_user.id,
-            WorkoutLog.program_id == log_data.program_id,
-            WorkoutLog.completed_at >= start_of_day,
-            WorkoutLog.completed_at <= end_of_day
+    now = utc_now()
+    
+    # Логирование тренировки означает, что программа начата:
+    # сохраненная (SAVED) программа становится начатой и активной
+    is_saved = UserProgram.status == ProgramStatus.SAVED
+    user_program_touched = (
+        update(UserProgram)
+        .where(
+            UserProgram.user_id == current_user.id,
+            UserProgram.program_id == log_data.program_id
         )
-    )
-    existing_log_result = await db.execute(existing_log_stmt)
-    existing_log = existing_log_result.scalars().first()
-
-    if existing_log:
-        # Update existing log instead of creating new one
-        existing_log.duration_minutes = log_data.duration_minutes
-        existing_log.notes = log_data.notes
-        
-        await db.commit()
-        await db.refresh(existing_log)
-        
-        # Обновим время последнего взаимодействия в UserProgram
-        await db.execute(
-            update(UserProgram)
-            .where(
-                and_(
-                    UserProgram.user_id == current_user.id,
-                    UserProgram.program_id == log_data.program_id
-                )
+        .values(
+            last_interaction_at=now,
+            status=case((is_saved, ProgramStatus.STARTED), else_=UserProgram.status),
+            is_active=case((is_saved, True), else_=UserProgram.is_active),
+            start_date=case(
+                (is_saved, func.coalesce(UserProgram.start_date, now)),
+                else_=UserProgram.start_date
             )
-            .values(last_interaction_at=datetime.utcnow())
         )
-        await db.commit()
-        
-        return existing_log
-
-    # Создаем запись
-    log = WorkoutLog(
+        .returning(UserProgram.id)
+        .cte("user_program_touched")
+    )
+    
+    stmt = pg_insert(WorkoutLog).values(
         user_id=current_user.id,
         program_id=log_data.program_id,
         day_number=log_data.day_number,
-        completed_at=log_data.completed_at or datetime.now(),
+        completed_at=log_data.completed_at or now,
         duration_minutes=log_data.duration_minutes,
         notes=log_data.notes
     )
-    
-    db.add(log)
-    
-    # Обновляем last_interaction_at
-    # Если это первая тренировка, UserProgram уже должен быть created/updated в start_program
-    # Но на всякий случай ensure
-    
-    # Также здесь можно обновить статус на STARTED, если он был SAVED?
-    # Логика: если юзер залогировал тренировку, значит программа активна/начата.
-    
-    # 1. Находим UserProgram
-    up_stmt = select(UserProgram).where(
-        and_(
-            UserProgram.user_id == current_user.id,
-            UserProgram.program_id == log_data.program_id
+    stmt = (
+        stmt.on_conflict_do_update(
+            # Уникальный индекс (user_id, program_id, date(completed_at))
+            index_elements=[
+                WorkoutLog.user_id,
+                WorkoutLog.program_id,
+                func.date(WorkoutLog.completed_at)
+            ],
+            set_={
+                "duration_minutes": stmt.excluded.duration_minutes,
+                "notes": stmt.excluded.notes,
+            }
         )
+        .returning(WorkoutLog)
+        .add_cte(user_program_touched)
     )
-    up_result = await db.execute(up_stmt)
-    user_program = up_result.scalar_one_or_none()
     
-    if user_program:
-        user_program.last_interaction_at = datetime.utcnow()
-        if user_program.status == ProgramStatus.SAVED:
-            user_program.status = ProgramStatus.STARTED
-            user_program.is_active = True # Делаем активной?
-            if not user_program.start_date:
-                user_program.start_date = datetime.utcnow()
-    
-    await db.commit()
-    await db.refresh(log)
+    result = await db.execute(stmt)
+    log = result.scalar_one()
     
-    return log
+    return model_response(WorkoutLogResponse, log)
 
 
 @router.get("/history", response_model=List[WorkoutLogResponse])
 async def get_workout_history(
-    skip: int = 0,
-    limit: int = 50,
+    skip: int = Query(0, ge=0, le=10000),
+    limit: int = Query(50, ge=1, le=200),
     program_id: Optional[UUID] = None,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Получить историю тренировок
+    
+    Для постраничной загрузки передавайте cursor и cursor_id из заголовков
+    X-Next-Cursor и X-Next-Cursor-Id предыдущей страницы (skip при этом не нужен)
     """
     query = select(WorkoutLog).where(WorkoutLog.user_id == current_user.id)
     
     if program_id:
         query = query.where(WorkoutLog.program_id == program_id)
+    
+    if cursor and cursor_id:
+        # Сравнение кортежей использует индекс (user_id, completed_at DESC, id DESC)
+        query = query.where(tuple_(WorkoutLog.completed_at, WorkoutLog.id) < tuple_(cursor, cursor_id))
         
-    query = query.order_by(desc(WorkoutLog.completed_at)).offset(skip).limit(limit)
+    query = query.order_by(desc(WorkoutLog.completed_at), desc(WorkoutLog.id)).offset(skip).limit(limit)
     
     result = await db.execute(query)
     logs = result.scalars().all()
     
-    return logs
+    response = await model_list_response_async(WorkoutLogResponse, logs)
+    if len(logs) == limit:
+        response.headers["X-Next-Cursor"] = logs[-1].completed_at.isoformat()
+        response.headers["X-Next-Cursor-Id"] = str(logs[-1].id)
+    return response
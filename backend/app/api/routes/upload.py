@@ -1,11 +1,58 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, status
 from typing import Dict
 from app.models.user import User
 from app.core.dependencies import get_current_active_user
 from app.services.image_upload import upload_image, upload_raw_file
 
+try:
+    import magic
+except ImportError:  # libmagic не установлен - доверяем content_type от клиента
+    magic = None
+
 router = APIRouter()
 
+# Сколько байт из начала файла нужно libmagic для определения типа
+SNIFF_BYTES = 2048
+
+# Типы файлов, которые можно загружать
+ALLOWED_UPLOAD_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "image/gif",
+    "video/mp4",
+    "text/html",
+}
+
+
+# Функция загрузки по основному типу MIME (image/..., video/...)
+_UPLOADERS = {
+    "image": upload_image,
+    "video": upload_image,
+}
+
+
+def _is_html(file: UploadFile) -> bool:
+    return file.content_type == "text/html" or bool(file.filename and file.filename.endswith('.html'))
+
+
+async def _sniff_content_type(file: UploadFile) -> str:
+    """
+    Определяет тип файла по сигнатуре (magic bytes), а не по заголовку клиента
+    """
+    if magic is None:
+        return file.content_type or ""
+    
+    head = await file.read(SNIFF_BYTES)
+    await file.seek(0)
+    content_type = magic.from_buffer(head, mime=True)
+    
+    # Фрагмент HTML без <!DOCTYPE>/<html> libmagic определяет как обычный текст
+    if content_type == "text/plain" and _is_html(file):
+        content_type = "text/html"
+    return content_type
+
+
 @router.post("/file", response_model=Dict[str, str])
 async def upload_file(
     file: UploadFile = File(...),
@@ -16,16 +63,17 @@ async def upload_file(
     Upload a file (image, video, or raw file like HTML) to Cloudinary. Returns the URL.
     Only authenticated users can upload.
     """
-    # Определяем тип файла
-    if file.content_type and (file.content_type.startswith("image/") or file.content_type.startswith("video/")):
-        # Изображения и видео
-        url = await upload_image(file, folder=folder)
-    elif file.content_type and (file.content_type == "text/html" or file.filename and file.filename.endswith('.html')):
-        # HTML файлы
-        url = await upload_raw_file(file, folder=folder)
-    else:
-        # Другие файлы (текстовые, документы и т.д.) - загружаем как raw
-        url = await upload_raw_file(file, folder=folder)
-        
+    # Проверяем тип по содержимому до обращения к Cloudinary
+    content_type = await _sniff_content_type(file)
+    if magic is not None and content_type not in ALLOWED_UPLOAD_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неподдерживаемый тип файла"
+        )
+    
+    # Изображения и видео - upload_image (resource_type=auto), остальное
+    # (HTML, текст, документы) - как raw
+    uploader = _UPLOADERS.get(content_type.split("/", 1)[0], upload_raw_file)
+    url = await uploader(file, folder=folder)
+    
     return {"url": url}
-
@@ -3,11 +3,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, update
 from typing import List, Optional
 from uuid import UUID
-from datetime import datetime
 
 from app.db.database import get_db
+from app.db.functions import utc_now
 from app.core.dependencies import get_current_active_user
-from app.models.user import User
+from app.core.responses import model_list_response_async
+from app.models.user import User, UserProfile
 from app.models.program import Program
 from app.models.user_program import UserProgram, ProgramStatus
 from app.schemas.program import ProgramResponse, ProgramWithStatus
@@ -23,10 +24,21 @@ async def get_my_programs(
     """
     Получить список программ пользователя (активные, сохраненные, завершенные)
     """
-    # Select both Program and UserProgram
+    # Только нужные колонки: программа, статус пользователя и автор одним запросом,
+    # без ORM объектов и копирования их состояния
     query = (
-        select(Program, UserProgram)
+        select(
+            *Program.__table__.columns,
+            UserProgram.status,
+            UserProgram.is_active,
+            UserProgram.start_date,
+            UserProgram.last_interaction_at,
+            User.email.label("author_email"),
+            UserProfile.full_name.label("author_full_name")
+        )
         .join(UserProgram, Program.id == UserProgram.program_id)
+        .join(User, User.id == Program.author_id)
+        .outerjoin(UserProfile, UserProfile.user_id == Program.author_id)
         .where(UserProgram.user_id == current_user.id)
     )
     
@@ -37,22 +49,21 @@ async def get_my_programs(
     query = query.order_by(UserProgram.last_interaction_at.desc())
     
     result = await db.execute(query)
-    rows = result.all()
     
     programs_with_status = []
-    for program, user_program in rows:
-        # Construct response manually mixing fields
-        p_dict = program.__dict__.copy()
-        
-        # Add status fields
-        p_dict['status'] = user_program.status
-        p_dict['is_active'] = user_program.is_active
-        p_dict['start_date'] = user_program.start_date
-        p_dict['last_interaction_at'] = user_program.last_interaction_at
-        
-        programs_with_status.append(ProgramWithStatus.model_validate(p_dict))
-        
-    return programs_with_status
+    for row in result.mappings():
+        p_dict = dict(row)
+        author_email = p_dict.pop("author_email")
+        author_full_name = p_dict.pop("author_full_name")
+        p_dict["author"] = {
+            "id": p_dict["author_id"],
+            "email": author_email,
+            "profile": {"full_name": author_full_name} if author_full_name is not None else None,
+        }
+        programs_with_status.append(p_dict)
+    
+    # Весь список валидируется и сериализуется одним вызовом pydantic-core
+    return await model_list_response_async(ProgramWithStatus, programs_with_status)
 
 
 @router.post("/save/{program_id}")
@@ -90,7 +101,7 @@ async def toggle_save_program(
             # Давай считать SAVED просто статусом.
             old_status = user_program.status
             user_program.status = ProgramStatus.SAVED
-            user_program.last_interaction_at = datetime.utcnow()
+            user_program.last_interaction_at = utc_now()
             await db.commit()
             return {"message": "Программа добавлена в сохраненные", "is_saved": True, "previous_status": old_status}
     else:
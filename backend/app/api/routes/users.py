@@ -1,19 +1,23 @@
 """
 API роутер для управления пользователями и профилями
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from uuid import UUID
-from datetime import date
+from datetime import datetime, time, timedelta
 
-from app.db.database import get_db
-from app.core.dependencies import get_current_active_user, require_admin
+from app.db.database import get_db, get_db_with_commit
+from app.db.functions import utc_today
+from app.core.cache import TTLCache
+from app.core.dependencies import get_current_active_user, require_admin, invalidate_cached_user
+from app.core.responses import model_response
 from app.models.user import User, UserProfile
 from app.models.metrics import BodyMetric
-from app.models.nutrition import NutritionLog, FoodProduct
+from app.models.nutrition import NutritionLog
 from app.schemas.user import (
     UserResponse,
     UserWithProfile,
@@ -25,6 +29,9 @@ from app.core.config import settings
 
 router = APIRouter()
 
+# Кэш ежедневных советов ИИ: (пользователь, день, входные данные) -> текст совета
+_advice_cache = TTLCache(maxsize=4096, ttl=3 * 3600)
+
 
 @router.get("/me", response_model=UserWithProfile)
 async def get_current_user_info(
@@ -33,8 +40,11 @@ async def get_current_user_info(
 ):
     """
     Получить информацию о текущем пользователе
+    
+    Пользователь берется из кэша get_current_user, поэтому при попадании
+    в кэш выполняется один запрос - за профилем. Профиль не загружается
+    в самой зависимости: иначе лишний запрос получил бы каждый роут
     """
-    # Загружаем профиль
     result = await db.execute(
         select(UserProfile).where(UserProfile.user_id == current_user.id)
     )
@@ -50,38 +60,35 @@ async def get_current_user_info(
         "profile": profile
     }
     
-    return user_dict
+    return model_response(UserWithProfile, user_dict)
 
 
 @router.put("/me/profile", response_model=UserProfileResponse)
 async def update_my_profile(
     profile_data: UserProfileUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_with_commit, scope="function")
 ):
     """
     Обновить профиль текущего пользователя
-    """
-    # Получаем профиль
-    result = await db.execute(
-        select(UserProfile).where(UserProfile.user_id == current_user.id)
-    )
-    profile = result.scalar_one_or_none()
-    
-    if not profile:
-        # Создаем профиль если его нет
-        profile = UserProfile(user_id=current_user.id)
-        db.add(profile)
     
+    Создание профиля (если его нет) и обновление переданных полей выполняются
+    одним запросом INSERT ... ON CONFLICT (user_id) DO UPDATE ... RETURNING
+    """
     # Обновляем только переданные поля
     update_data = profile_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(profile, field, value)
     
-    await db.commit()
-    await db.refresh(profile)
+    stmt = pg_insert(UserProfile).values(user_id=current_user.id, **update_data)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserProfile.user_id],
+        # Без полей - пустое обновление, чтобы RETURNING вернул существующий профиль
+        set_={field: stmt.excluded[field] for field in update_data} or {"user_id": stmt.excluded.user_id}
+    ).returning(UserProfile)
+    
+    result = await db.execute(stmt)
+    profile = result.scalar_one()
     
-    return profile
+    return model_response(UserProfileResponse, profile)
 
 
 @router.get("/", response_model=List[UserWithProfile], dependencies=[Depends(require_admin)])
@@ -105,6 +112,52 @@ async def list_users(
     return users
 
 
+async def _set_users_active(db: AsyncSession, user_ids: List[UUID], is_active: bool) -> List[UUID]:
+    """
+    Блокировка/разблокировка пользователей одним UPDATE ... RETURNING
+    
+    Returns:
+        id найденных (измененных) пользователей
+    """
+    result = await db.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(is_active=is_active)
+        .returning(User.id)
+    )
+    updated_ids = list(result.scalars().all())
+    await db.commit()
+    
+    # Кэш сбрасываем после commit, чтобы он не успел заполниться старыми данными
+    for user_id in updated_ids:
+        invalidate_cached_user(user_id)
+    return updated_ids
+
+
+@router.patch("/block", dependencies=[Depends(require_admin)])
+async def block_users(
+    user_ids: List[UUID] = Body(..., min_length=1, max_length=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Заблокировать нескольких пользователей (только для администраторов)
+    """
+    updated_ids = await _set_users_active(db, user_ids, False)
+    return {"message": "Пользователи заблокированы", "user_ids": updated_ids}
+
+
+@router.patch("/unblock", dependencies=[Depends(require_admin)])
+async def unblock_users(
+    user_ids: List[UUID] = Body(..., min_length=1, max_length=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Разблокировать нескольких пользователей (только для администраторов)
+    """
+    updated_ids = await _set_users_active(db, user_ids, True)
+    return {"message": "Пользователи разблокированы", "user_ids": updated_ids}
+
+
 @router.patch("/{user_id}/block", dependencies=[Depends(require_admin)])
 async def block_user(
     user_id: UUID,
@@ -113,18 +166,12 @@ async def block_user(
     """
     Заблокировать пользователя (только для администраторов)
     """
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    
-    if not user:
+    if not await _set_users_active(db, [user_id], False):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден"
         )
     
-    user.is_active = False
-    await db.commit()
-    
     return {"message": "Пользователь заблокирован"}
 
 
@@ -136,18 +183,12 @@ async def unblock_user(
     """
     Разблокировать пользователя (только для администраторов)
     """
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    
-    if not user:
+    if not await _set_users_active(db, [user_id], True):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден"
         )
     
-    user.is_active = True
-    await db.commit()
-    
     return {"message": "Пользователь разблокирован"}
 
 
@@ -166,61 +207,64 @@ async def get_daily_advice(
             detail="Сервис советов временно недоступен"
         )
     
-    # Получаем профиль пользователя
-    profile_result = await db.execute(
-        select(UserProfile).where(UserProfile.user_id == current_user.id)
+    # Профиль, последний вес и КБЖУ за сегодня - независимые чтения; вместо трех
+    # последовательных запросов (или трех сессий и соединений для asyncio.gather)
+    # они объединены в один запрос
+    today = utc_today()
+    day_start = datetime.combine(today, time.min)
+    multiplier = NutritionLog.weight_g / 100.0
+    totals = (
+        select(
+            func.coalesce(func.sum(NutritionLog.calories_per_100g * multiplier), 0).label("calories"),
+            func.coalesce(func.sum(NutritionLog.proteins_per_100g * multiplier), 0).label("proteins"),
+            func.coalesce(func.sum(NutritionLog.fats_per_100g * multiplier), 0).label("fats"),
+            func.coalesce(func.sum(NutritionLog.carbs_per_100g * multiplier), 0).label("carbs"),
+        )
+        .where(
+            # Полуоткрытый диапазон вместо date(eaten_at): использует индекс (user_id, eaten_at DESC)
+            NutritionLog.user_id == current_user.id,
+            NutritionLog.eaten_at >= day_start,
+            NutritionLog.eaten_at < day_start + timedelta(days=1)
+        )
+        .subquery("totals")
     )
-    profile = profile_result.scalar_one_or_none()
-    
-    if not profile:
-        profile_dict = {}
-    else:
-        profile_dict = {
-            'full_name': profile.full_name,
-            'gender': profile.gender,
-            'height': profile.height,
-        }
-    
-    # Получаем последний вес
-    latest_weight = None
-    weight_result = await db.execute(
-        select(BodyMetric)
+    latest_weight = (
+        select(BodyMetric.weight)
         .where(BodyMetric.user_id == current_user.id)
-        .order_by(BodyMetric.date.desc())
+        # Порядок совпадает с индексом (user_id, date DESC, id DESC)
+        .order_by(BodyMetric.date.desc(), BodyMetric.id.desc())
         .limit(1)
+        .scalar_subquery()
     )
-    weight_metric = weight_result.scalar_one_or_none()
-    if weight_metric:
-        latest_weight = weight_metric.weight
-    
-    # Получаем калории за сегодня
-    today = date.today()
-    nutrition_result = await db.execute(
-        select(NutritionLog)
-        .where(
-            NutritionLog.user_id == current_user.id,
-            func.date(NutritionLog.eaten_at) == today
+    result = await db.execute(
+        select(
+            totals,
+            latest_weight.label("latest_weight"),
+            UserProfile.user_id.label("profile_user_id"),
+            UserProfile.full_name,
+            UserProfile.gender,
+            UserProfile.height,
+            UserProfile.target_calories,
+            UserProfile.target_weight,
         )
+        .select_from(totals)
+        .outerjoin(UserProfile, UserProfile.user_id == current_user.id)
     )
-    logs = nutrition_result.scalars().all()
+    data = result.one()
     
-    today_calories = 0.0
-    total_proteins = 0.0
-    total_fats = 0.0
-    total_carbs = 0.0
+    if data.profile_user_id is None:
+        profile_dict = {}
+    else:
+        profile_dict = {
+            'full_name': data.full_name,
+            'gender': data.gender,
+            'height': data.height,
+        }
     
-    for log in logs:
-        product_result = await db.execute(
-            select(FoodProduct).where(FoodProduct.id == log.product_id)
-        )
-        product = product_result.scalar_one_or_none()
-        
-        if product:
-            multiplier = log.weight_g / 100.0
-            today_calories += product.calories * multiplier
-            total_proteins += product.proteins * multiplier
-            total_fats += product.fats * multiplier
-            total_carbs += product.carbs * multiplier
+    today_calories = data.calories
+    total_proteins = data.proteins
+    total_fats = data.fats
+    total_carbs = data.carbs
     
     nutrition_summary = {
         'total_proteins': total_proteins,
@@ -228,16 +272,28 @@ async def get_daily_advice(
         'total_carbs': total_carbs,
     }
     
-    # Генерируем совет
-    advice = await generate_daily_advice(
-        user_profile=profile_dict,
-        today_calories=today_calories,
-        target_calories=profile.target_calories if profile else None,
-        latest_weight=latest_weight,
-        target_weight=profile.target_weight if profile else None,
-        nutrition_summary=nutrition_summary,
-        api_key=settings.GOOGLE_GEMINI_API_KEY
+    # Совет зависит только от этих данных: пока они не изменились, ответ ИИ
+    # берется из кэша (в ключе - сами данные, поэтому сбрасывать кэш не нужно)
+    cache_key = (
+        current_user.id, today, tuple(profile_dict.items()),
+        today_calories, total_proteins, total_fats, total_carbs,
+        data.target_calories, data.latest_weight, data.target_weight
     )
+    advice = _advice_cache.get(cache_key)
+    
+    if advice is None:
+        # Генерируем совет
+        advice = await generate_daily_advice(
+            user_profile=profile_dict,
+            today_calories=today_calories,
+            target_calories=data.target_calories,
+            latest_weight=data.latest_weight,
+            target_weight=data.target_weight,
+            nutrition_summary=nutrition_summary,
+            api_key=settings.GOOGLE_GEMINI_API_KEY
+        )
+        if advice:
+            _advice_cache.set(cache_key, advice)
     
     if not advice:
         # Fallback совет если ИИ не ответил
@@ -0,0 +1,71 @@
+"""
+Простой in-process кэш с ограничением размера (LRU) и временем жизни записей (TTL)
+Используется для кэширования редко меняющихся данных в пределах одного воркера
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    LRU-кэш с TTL
+
+    Args:
+        maxsize: Максимальное количество записей
+        ttl: Время жизни записи в секундах по умолчанию
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Получить значение по ключу или default, если записи нет или она устарела
+        """
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Сохранить значение (ttl переопределяет время жизни по умолчанию)
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Удалить запись и вернуть ее значение
+        """
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        """
+        Очистить кэш
+        """
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
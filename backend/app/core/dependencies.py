@@ -5,10 +5,13 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
 from typing import Optional
 from uuid import UUID
 
 from app.db.database import get_db
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.security import decode_token
 from app.models.user import User, UserRole
 from app.schemas.user import TokenData
@@ -16,6 +19,49 @@ from app.schemas.user import TokenData
 # OAuth2 схема для извлечения токена из заголовка Authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Кэш пользователей: user_id -> значения колонок User
+# В пределах одного запроса FastAPI и так вызывает зависимость один раз,
+# кэш убирает SELECT users для запросов подряд от одного пользователя
+#
+# Кэш живет в памяти процесса, и invalidate_cached_user сбрасывает его только
+# в текущем воркере. Поэтому кэш включен только при одном воркере
+# (WEB_CONCURRENCY = 1, как в Dockerfile): иначе заблокированный пользователь
+# сохранял бы доступ через другие воркеры до истечения TTL
+USER_CACHE_ENABLED = settings.CURRENT_USER_CACHE_TTL > 0 and settings.WEB_CONCURRENCY == 1
+_user_cache = TTLCache(maxsize=4096, ttl=settings.CURRENT_USER_CACHE_TTL)
+# Хэш пароля аутентификации не нужен и в кэше не хранится
+_USER_CACHE_FIELDS = ("id", "email", "role", "telegram_id", "created_at", "is_active")
+
+
+def invalidate_cached_user(user_id: UUID) -> None:
+    """
+    Сбросить кэш пользователя (после изменения роли, блокировки и т.п.)
+    """
+    _user_cache.pop(user_id)
+
+
+async def _load_user(db: AsyncSession, user_id: UUID) -> Optional[User]:
+    """
+    Получить пользователя из кэша или из БД
+    
+    Запрос пользователя нельзя выполнять параллельно с запросом роута
+    (asyncio.gather): обе зависимости используют одну AsyncSession, а ни сессия,
+    ни соединение asyncpg не допускают конкурентных операций. Лишний round-trip
+    вместо этого убирает кэш - при попадании SELECT users не выполняется
+    """
+    cached = _user_cache.get(user_id) if USER_CACHE_ENABLED else None
+    if cached is not None:
+        # Присоединяем к сессии как уже загруженный объект, без SELECT
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+    
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    if user is not None and USER_CACHE_ENABLED:
+        _user_cache.set(user_id, {field: getattr(user, field) for field in _USER_CACHE_FIELDS})
+    return user
+
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -54,9 +100,8 @@ async def get_current_user(
     except ValueError:
         raise credentials_exception
     
-    # Получаем пользователя из БД
-    result = await db.execute(select(User).where(User.id == user_uuid))
-    user = result.scalar_one_or_none()
+    # Получаем пользователя (при одном воркере - кэш на CURRENT_USER_CACHE_TTL секунд)
+    user = await _load_user(db, user_uuid)
     
     if user is None:
         raise credentials_exception
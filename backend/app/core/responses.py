@@ -0,0 +1,87 @@
+"""
+Готовые JSON ответы из Pydantic схем
+Если роут возвращает Response, FastAPI не валидирует результат повторно через
+response_model (response_model в декораторе остается для документации OpenAPI)
+"""
+import asyncio
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Type
+
+from fastapi import Response, status
+from pydantic import BaseModel, TypeAdapter
+
+# Начиная с какого размера списка сериализация выносится в поток
+OFFLOAD_MIN_ITEMS = 50
+
+
+def model_response(
+    schema: Type[BaseModel],
+    obj: Any,
+    status_code: int = status.HTTP_200_OK
+) -> Response:
+    """
+    Сериализует один объект (ORM или dict) по схеме в JSON ответ
+    """
+    return Response(
+        content=schema.model_validate(obj, from_attributes=True).model_dump_json(),
+        media_type="application/json",
+        status_code=status_code
+    )
+
+
+@lru_cache(maxsize=None)
+def list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    """
+    TypeAdapter для списка схемы (создается один раз на схему)
+    """
+    return TypeAdapter(List[schema])
+
+
+def model_list_response(schema: Type[BaseModel], items: Iterable[Any]) -> Response:
+    """
+    Сериализует список объектов по схеме в JSON ответ
+    Валидация и сериализация всего списка выполняются одним вызовом pydantic-core
+    """
+    adapter = list_adapter(schema)
+    return Response(
+        content=adapter.dump_json(adapter.validate_python(list(items), from_attributes=True)),
+        media_type="application/json"
+    )
+
+
+async def model_list_response_async(schema: Type[BaseModel], items: Iterable[Any]) -> Response:
+    """
+    То же, что model_list_response, но большие списки сериализуются в пуле потоков,
+    чтобы не занимать event loop
+    """
+    items = list(items)
+    if len(items) < OFFLOAD_MIN_ITEMS:
+        return model_list_response(schema, items)
+    return await asyncio.to_thread(model_list_response, schema, items)
+
+
+def etag_for(body: bytes) -> str:
+    """
+    ETag по содержимому ответа
+    """
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def cached_json_response(
+    body: bytes,
+    if_none_match: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    cache_control: str = "private, max-age=30"
+) -> Response:
+    """
+    JSON ответ с ETag и Cache-Control; если клиент прислал тот же ETag
+    в If-None-Match, возвращается 304 без тела
+    """
+    etag = etag_for(body)
+    response_headers = {**(headers or {}), "ETag": etag, "Cache-Control": cache_control}
+    
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response_headers)
+    
+    return Response(content=body, media_type="application/json", headers=response_headers)
@@ -1,15 +1,24 @@
 """
 Модуль безопасности: хэширование паролей и работа с JWT токенами
 """
+import asyncio
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.cache import TTLCache
 
 # Контекст для хэширования паролей с использованием bcrypt
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Кэш проверенных токенов: один и тот же токен приходит с каждым запросом,
+# повторно проверять подпись до истечения срока не нужно
+TOKEN_CACHE_TTL = 60
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -38,6 +47,48 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+@lru_cache(maxsize=1)
+def _dummy_password_hash() -> str:
+    """
+    Хэш-заглушка для проверки пароля несуществующего пользователя
+    """
+    return pwd_context.hash("dummy-password-for-timing")
+
+
+async def verify_password_async(plain_password: str, hashed_password: Optional[str]) -> bool:
+    """
+    Проверяет пароль в отдельном потоке, не блокируя event loop
+    
+    Если хэша нет (пользователь не найден), проверяем пароль против заглушки,
+    чтобы время ответа не выдавало существование email
+    
+    Args:
+        plain_password: Пароль в открытом виде
+        hashed_password: Хэшированный пароль из БД или None
+        
+    Returns:
+        True если пароль верный, иначе False
+    """
+    if hashed_password is None:
+        # Хэш-заглушка вычисляется (при первом вызове) тоже в потоке, а не в event loop
+        await asyncio.to_thread(lambda: verify_password(plain_password, _dummy_password_hash()))
+        return False
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Создает хэш пароля в отдельном потоке, не блокируя event loop
+    
+    Args:
+        password: Пароль в открытом виде
+        
+    Returns:
+        Хэшированный пароль
+    """
+    return await asyncio.to_thread(get_password_hash, password)
+
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """
     Создает JWT Access токен
@@ -82,15 +133,27 @@ def decode_token(token: str) -> Optional[Dict[str, Any]]:
     """
     Декодирует и проверяет JWT токен
     
+    Результат проверки кэшируется по строке токена не дольше TOKEN_CACHE_TTL
+    секунд и не дольше срока действия токена (exp)
+    
     Args:
         token: JWT токен для декодирования
         
     Returns:
         Данные из токена или None при ошибке
     """
+    payload = _token_cache.get(token)
+    if payload is not None:
+        return payload
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         return None
-
+    
+    ttl = TOKEN_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        _token_cache.set(token, payload, ttl=ttl)
+    return payload
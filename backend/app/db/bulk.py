@@ -0,0 +1,93 @@
+"""
+Утилиты для массовых операций с данными (бэкфиллы, сиды)
+"""
+import logging
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(rows: Iterable[Sequence[Any]], size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def execute_pipelined(
+    conn: AsyncConnection,
+    sql: str,
+    rows: Iterable[Sequence[Any]],
+    chunk_size: int = 1000
+) -> int:
+    """
+    Выполняет один и тот же запрос для множества наборов параметров
+
+    Использует executemany драйвера asyncpg: Bind/Execute для всех строк чанка
+    отправляются пакетом без ожидания ответа на каждую строку
+
+    Args:
+        conn: Асинхронное соединение SQLAlchemy
+        sql: Запрос в нотации asyncpg ($1, $2, ...)
+        rows: Наборы параметров (кортежи)
+        chunk_size: Сколько строк отправлять за один вызов
+
+    Returns:
+        Количество обработанных строк
+    """
+    raw = await conn.get_raw_connection()
+    driver_conn = raw.driver_connection
+
+    total = 0
+    for chunk in _chunks(rows, chunk_size):
+        await driver_conn.executemany(sql, chunk)
+        total += len(chunk)
+
+    logger.info(f"Pipelined execute: {total} rows")
+    return total
+
+
+def batched_update(connection: Connection, sql: str, batch: int = 5000) -> int:
+    """
+    Обновление данных в миграциях Alembic порциями по batch строк
+
+    Вызывать внутри op.get_context().autocommit_block(): каждая порция
+    коммитится отдельно, поэтому блокировки держатся недолго и нет одной
+    огромной транзакции
+
+    Пример:
+        with op.get_context().autocommit_block():
+            batched_update(op.get_bind(), '''
+                UPDATE food_products SET source = 'legacy'
+                WHERE id IN (
+                    SELECT id FROM food_products WHERE source IS NULL
+                    LIMIT :batch FOR UPDATE SKIP LOCKED
+                )
+            ''')
+
+    Args:
+        connection: Синхронное соединение (op.get_bind())
+        sql: UPDATE с подзапросом ... LIMIT :batch FOR UPDATE SKIP LOCKED
+        batch: Размер порции
+
+    Returns:
+        Количество обновленных строк
+    """
+    total = 0
+    while True:
+        updated = connection.execute(text(sql), {"batch": batch}).rowcount
+        total += updated
+        if updated < batch:
+            break
+
+    logger.info(f"Batched update: {total} rows")
+    return total
+
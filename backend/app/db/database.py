@@ -3,36 +3,69 @@
 Использует SQLAlchemy с асинхронным драйвером asyncpg для PostgreSQL
 """
 import logging
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import uuid
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.pool import NullPool
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Настройки подключения для Neon
-connect_args = {}
-if 'neon.tech' in settings.DATABASE_URL:
-    # Для Neon используем SSL
+
+def _create_engine(database_url: str) -> AsyncEngine:
+    """
+    Создает асинхронный движок для подключения к БД
+    """
     connect_args = {
-        "ssl": "require"
+        # JIT не окупается на коротких OLTP запросах и замедляет интроспекцию типов asyncpg
+        "server_settings": {"jit": "off"},
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
     }
-    logger.info("Using SSL connection for Neon database")
-
-# Создаем асинхронный движок для подключения к БД
-# Для pooler используем NullPool, для прямого подключения - можно использовать pool
-use_pool = not ('-pooler' in settings.DATABASE_URL or 'pooler' in settings.DATABASE_URL.lower())
-
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,  # Логирование SQL запросов в режиме отладки
-    future=True,
-    pool_pre_ping=True,  # Проверка соединения перед использованием
-    poolclass=NullPool if not use_pool else None,  # Для pooler используем NullPool
-    connect_args=connect_args if connect_args else None,
-)
+    
+    # Настройки подключения для Neon
+    if 'neon.tech' in database_url:
+        # Для Neon используем SSL
+        connect_args["ssl"] = "require"
+        logger.info("Using SSL connection for Neon database")
+
+    # Для pooler используем NullPool, для прямого подключения - можно использовать pool
+    use_pool = not ('-pooler' in database_url or 'pooler' in database_url.lower())
+
+    if not use_pool:
+        # PgBouncer в режиме транзакций отдает разные серверные соединения,
+        # поэтому кэши prepared statements отключаем, а имена делаем уникальными
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+
+    # Размер пула задаем только для собственного пула (NullPool их не принимает)
+    pool_kwargs = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    } if use_pool else {}
+
+    return create_async_engine(
+        database_url,
+        echo=settings.DEBUG,  # Логирование SQL запросов в режиме отладки
+        future=True,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,  # Проверка соединения перед использованием
+        poolclass=NullPool if not use_pool else None,  # Для pooler используем NullPool
+        connect_args=connect_args,
+        **pool_kwargs,
+    )
+
+
+# Основной движок (чтение и запись)
+engine = _create_engine(settings.DATABASE_URL)
+
+# Движок реплики для read-only запросов
+engine_ro = _create_engine(settings.DATABASE_URL_RO) if settings.DATABASE_URL_RO else engine
 
 # Фабрика сессий для работы с БД
+# expire_on_commit=False: объекты остаются заполненными после commit, refresh не нужен
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -41,6 +74,15 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+# Фабрика read-only сессий (реплика)
+AsyncSessionLocalRO = async_sessionmaker(
+    engine_ro,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+)
+
 # Базовый класс для всех моделей
 Base = declarative_base()
 
@@ -49,6 +91,10 @@ async def get_db() -> AsyncSession:
     """
     Dependency для получения сессии БД в FastAPI endpoints
     
+    FastAPI кэширует зависимость в пределах запроса, поэтому get_current_user,
+    get_db_with_commit и сам роут получают одну и ту же сессию: одно соединение
+    из пула и одна транзакция (autobegin) на весь запрос
+    
     Yields:
         AsyncSession: Асинхронная сессия для работы с БД
     """
@@ -59,6 +105,46 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+async def get_db_with_commit(db: AsyncSession = Depends(get_db)) -> AsyncSession:
+    """
+    Dependency для изменяющих endpoints: транзакция на весь запрос
+    
+    commit выполняется при успешном завершении роута, rollback - при ошибке.
+    Подключать с scope="function", чтобы commit завершался до отправки ответа
+    (иначе клиент получит успешный ответ даже при ошибке commit)
+    
+    Yields:
+        AsyncSession: Асинхронная сессия (та же, что у get_db в этом запросе)
+    """
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def get_db_ro(db: AsyncSession = Depends(get_db)) -> AsyncSession:
+    """
+    Dependency для read-only endpoints: сессия на реплике (DATABASE_URL_RO)
+    
+    Если реплика не настроена, роут получает ту же сессию, что и get_db
+    (и get_current_user): второе соединение на запрос не открывается
+    
+    Yields:
+        AsyncSession: Асинхронная сессия только для чтения
+    """
+    if engine_ro is engine:
+        yield db
+        return
+    
+    async with AsyncSessionLocalRO() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 async def init_db():
     """
     Инициализация базы данных - создание всех таблиц
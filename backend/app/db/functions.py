@@ -0,0 +1,40 @@
+"""
+SQL выражения, вычисляемые на стороне БД, и согласованные с ними значения
+"""
+from datetime import date, datetime, timezone
+
+from sqlalchemy import func, literal, select
+
+
+def utc_now():
+    """
+    Текущее время в UTC на стороне БД (timestamp without time zone)
+    
+    Колонки DateTime хранят наивное UTC время; now() возвращает timestamptz,
+    который при записи в timestamp переводится в часовой пояс сессии,
+    поэтому время явно приводится к UTC. В пределах транзакции значение одно
+    """
+    return func.timezone("utc", func.now())
+
+
+def utc_today() -> date:
+    """
+    Сегодняшняя дата в UTC
+    
+    Время в БД хранится в UTC (utc_now), поэтому "сегодня" для выборок за день,
+    дневных уникальных индексов и дат старта считается по той же границе суток,
+    а не по часовому поясу сервера
+    """
+    return datetime.now(timezone.utc).date()
+
+
+def typed_row(model, values: dict):
+    """
+    SELECT из литералов с типами колонок модели (для INSERT ... SELECT)
+    
+    Args:
+        model: ORM модель, в таблицу которой выполняется вставка
+        values: Значения по именам колонок (порядок сохраняется)
+    """
+    table = model.__table__
+    return select(*[literal(value, type_=table.c[key].type) for key, value in values.items()])
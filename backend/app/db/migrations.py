@@ -0,0 +1,109 @@
+"""
+Запуск миграций Alembic при старте приложения
+Режим задается через settings.MIGRATION_MODE: async, sync или skip
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Корень backend (где лежит alembic.ini)
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+@dataclass
+class MigrationStatus:
+    """Состояние миграций для /health/migrations"""
+    mode: str = "skip"
+    state: str = "pending"  # pending, running, succeeded, failed, skipped
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+migration_status = MigrationStatus()
+
+
+def _upgrade_head() -> None:
+    """
+    Синхронный вызов alembic upgrade head (выполняется в отдельном потоке)
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    cfg = Config(str(BACKEND_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    # Не перенастраиваем логирование приложения из alembic.ini
+    cfg.attributes["configure_logger"] = False
+    command.upgrade(cfg, "head")
+
+
+async def run_migrations() -> None:
+    """
+    Применяет миграции под advisory lock, чтобы при нескольких воркерах
+    миграции выполнял только один из них
+    """
+    migration_status.state = "running"
+    migration_status.started_at = datetime.utcnow()
+
+    try:
+        async with engine.connect() as conn:
+            deadline = asyncio.get_running_loop().time() + settings.MIGRATION_LOCK_TIMEOUT
+            while True:
+                result = await conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"),
+                    {"key": settings.MIGRATION_LOCK_KEY}
+                )
+                if result.scalar():
+                    break
+                if asyncio.get_running_loop().time() >= deadline:
+                    raise TimeoutError("Не удалось получить advisory lock для миграций")
+                await asyncio.sleep(1)
+
+            try:
+                logger.info("Running Alembic migrations (upgrade head)")
+                await asyncio.to_thread(_upgrade_head)
+            finally:
+                await conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"),
+                    {"key": settings.MIGRATION_LOCK_KEY}
+                )
+                await conn.commit()
+
+        migration_status.state = "succeeded"
+        logger.info("✅ Migrations applied")
+    except Exception as e:
+        migration_status.state = "failed"
+        migration_status.error = str(e)
+        logger.error(f"❌ Migrations failed: {e}")
+    finally:
+        migration_status.finished_at = datetime.utcnow()
+
+
+async def start_migrations() -> Optional[asyncio.Task]:
+    """
+    Запускает миграции согласно MIGRATION_MODE
+    - async: в фоновой задаче, приложение сразу начинает принимать запросы
+    - sync: старт приложения ждет завершения миграций
+    - skip: миграции не запускаются (применяются вручную через alembic)
+    """
+    mode = settings.MIGRATION_MODE.lower()
+    migration_status.mode = mode
+
+    if mode == "async":
+        return asyncio.create_task(run_migrations())
+    if mode == "sync":
+        await run_migrations()
+        return None
+
+    migration_status.state = "skipped"
+    return None
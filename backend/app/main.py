@@ -1,13 +1,18 @@
 """
 Главный файл FastAPI приложения My Fitness Trainer
 """
+import asyncio
 import logging
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 from app.core.config import settings
 from app.api import api_router
 from app.db.database import init_db
+from app.db.migrations import migration_status, start_migrations
+from app.services.article_views import run_views_flusher
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,6 +21,58 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Инициализация при запуске и очистка при остановке приложения
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"🚀 Starting {settings.APP_NAME} v{settings.VERSION}")
+    logger.info(f"Environment: {settings.ENVIRONMENT}")
+    logger.info(f"CORS Origins: {settings.CORS_ORIGINS}")
+    
+    # Проверка подключения к БД
+    try:
+        from app.db.database import engine
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        logger.info("✅ Database connection successful")
+    except Exception as e:
+        logger.error(f"❌ Database connection failed: {e}")
+        # Не падаем при старте, но логируем ошибку
+    
+    # Миграции Alembic (MIGRATION_MODE=async не блокирует прием запросов)
+    migration_task = await start_migrations()
+    
+    # В продакшене используем Alembic вместо init_db()
+    # await init_db()
+    
+    # Пакетная запись просмотров статей
+    views_flusher = asyncio.create_task(run_views_flusher())
+    
+    yield
+    
+    views_flusher.cancel()
+    try:
+        await views_flusher
+    except asyncio.CancelledError:
+        pass
+    
+    from app.api.routes.articles import close_http_client
+    await close_http_client()
+    
+    from app.services.recognition_queue import recognition_queue
+    await recognition_queue.close()
+    
+    if migration_task and not migration_task.done():
+        migration_task.cancel()
+        try:
+            await migration_task
+        except asyncio.CancelledError:
+            pass
+
+
 # Создаем экземпляр приложения
 app = FastAPI(
     title=settings.APP_NAME,
@@ -23,6 +80,7 @@ app = FastAPI(
     description="API для фитнес-приложения с трекингом тренировок, питания и прогресса",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
+    lifespan=lifespan,
 )
 
 # Настройка CORS для работы с фронтендом
@@ -59,30 +117,6 @@ app.add_middleware(
 logger.info(f"✅ CORS middleware configured with origins: {cors_origins}")
 
 
-@app.on_event("startup")
-async def startup_event():
-    """
-    Инициализация при запуске приложения
-    """
-    logger = logging.getLogger(__name__)
-    logger.info(f"🚀 Starting {settings.APP_NAME} v{settings.VERSION}")
-    logger.info(f"Environment: {settings.ENVIRONMENT}")
-    logger.info(f"CORS Origins: {settings.CORS_ORIGINS}")
-    
-    # Проверка подключения к БД
-    try:
-        from app.db.database import engine
-        async with engine.connect() as conn:
-            await conn.execute(text("SELECT 1"))
-        logger.info("✅ Database connection successful")
-    except Exception as e:
-        logger.error(f"❌ Database connection failed: {e}")
-        # Не падаем при старте, но логируем ошибку
-    
-    # В продакшене используем Alembic вместо init_db()
-    # await init_db()
-
-
 @app.get("/")
 async def root():
     """
@@ -104,6 +138,14 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/migrations")
+async def migrations_health_check():
+    """
+    Состояние миграций Alembic, запущенных при старте
+    """
+    return asdict(migration_status)
+
+
 # Подключаем API роутеры
 app.include_router(api_router, prefix="/api")
 
@@ -3,9 +3,9 @@
 """
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, ForeignKey, DateTime, Integer, ARRAY, Boolean
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, ForeignKey, DateTime, Integer, ARRAY, Boolean, Computed, Index, func, text
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import relationship, deferred, column_property
 from app.db.database import Base
 
 
@@ -27,6 +27,26 @@ class Article(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     is_published = Column(Boolean, default=False, nullable=False)
+    # Количество просмотров считается в БД, чтобы в списках не грузить массив viewed_by
+    views_count = column_property(func.coalesce(func.cardinality(viewed_by), 0), deferred=True)
+    # Поисковый вектор (title - вес A, excerpt - вес B, теги), вычисляется PostgreSQL
+    search_tsv = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple'::regconfig, coalesce(excerpt, '')), 'B') || "
+            "to_tsvector('simple'::regconfig, articles_tags_to_text(tags))",
+            persisted=True
+        ),
+        nullable=True
+    ))
+
+    __table_args__ = (
+        Index('ix_articles_search_tsv', 'search_tsv', postgresql_using='gin'),
+        Index('ix_articles_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        # Список опубликованных статей: WHERE is_published ORDER BY created_at DESC
+        Index('ix_articles_published_created', created_at.desc(), postgresql_where=text('is_published = true')),
+    )
 
     # Relationship
     author = relationship("User", back_populates="articles")
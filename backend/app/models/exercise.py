@@ -2,7 +2,7 @@
 Модель упражнений для тренировочных программ
 """
 import uuid
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, Index
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import relationship
 from app.db.database import Base
@@ -16,10 +16,15 @@ class Exercise(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String, nullable=False, unique=True, index=True)
-    muscle_groups = Column(ARRAY(String), nullable=False, index=True)  # Группы мышц
+    muscle_groups = Column(ARRAY(String), nullable=False)  # Группы мышц
     video_urls = Column(ARRAY(String), nullable=True)  # Ссылки на видео
     description = Column(String, nullable=True)  # Описание техники выполнения
 
+    __table_args__ = (
+        # GIN индекс для фильтрации по группе мышц (&&, @>)
+        Index('ix_exercises_muscle_groups_gin', 'muscle_groups', postgresql_using='gin'),
+    )
+
     # Relationship
     program_details = relationship("ProgramDetail", back_populates="exercise", cascade="all, delete-orphan")
 
@@ -3,7 +3,7 @@
 """
 import uuid
 from datetime import date
-from sqlalchemy import Column, ForeignKey, Date, Float, String
+from sqlalchemy import Column, ForeignKey, Date, Float, String, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.db.database import Base
@@ -27,6 +27,12 @@ class BodyMetric(Base):
     photo_url = Column(String, nullable=True)  # Ссылка на фото прогресса
     notes = Column(String, nullable=True)  # Заметки к замерам
 
+    __table_args__ = (
+        # История замеров пользователя и keyset пагинация (ORDER BY date DESC, id DESC);
+        # weight в INCLUDE - последний вес читается index-only scan
+        Index('ix_body_metrics_user_date', 'user_id', date.desc(), id.desc(), postgresql_include=['weight']),
+    )
+
     # Relationship
     user = relationship("User", back_populates="body_metrics")
 
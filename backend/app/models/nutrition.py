@@ -3,7 +3,7 @@
 """
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Float, ForeignKey, DateTime, Integer
+from sqlalchemy import Column, String, Float, ForeignKey, DateTime, Integer, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.db.database import Base
@@ -31,11 +31,16 @@ class FoodProduct(Base):
     nutrition_logs = relationship("NutritionLog", back_populates="product", cascade="all, delete-orphan")
     user = relationship("User", back_populates="custom_products")
 
+    __table_args__ = (
+        # Триграммный GIN индекс для поиска по подстроке (ILIKE '%...%'), требует pg_trgm
+        Index('ix_food_products_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
 
 class NutritionLog(Base):
     """
     Запись в дневнике питания - что съел пользователь
-    Калории и макросы рассчитываются на основе веса порции
+    Калории и макросы рассчитываются на основе веса порции и снимка КБЖУ продукта
     """
     __tablename__ = "nutrition_logs"
 
@@ -46,11 +51,22 @@ class NutritionLog(Base):
     eaten_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     meal_type = Column(String, nullable=True)  # breakfast, lunch, dinner, snack
     notes = Column(String, nullable=True)
+    # Снимок продукта на момент записи: чтение дневника и сводки не требует JOIN с food_products
+    product_name = Column(String, nullable=True)
+    calories_per_100g = Column(Float, nullable=True)
+    proteins_per_100g = Column(Float, nullable=True)
+    fats_per_100g = Column(Float, nullable=True)
+    carbs_per_100g = Column(Float, nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="nutrition_logs")
     product = relationship("FoodProduct", back_populates="nutrition_logs")
 
+    __table_args__ = (
+        # Фильтр по диапазону eaten_at и сортировка по убыванию даты
+        Index('ix_nutrition_logs_user_eaten', 'user_id', eaten_at.desc()),
+    )
+
 
 class HydrationLog(Base):
     """
@@ -2,12 +2,12 @@
 Модели тренировочных программ: Program (общая информация) и ProgramDetail (упражнения в программе)
 """
 import uuid
-from datetime import datetime
-from sqlalchemy import Column, String, Boolean, Integer, ForeignKey, DateTime, Float
+from sqlalchemy import Column, String, Boolean, Integer, ForeignKey, DateTime, Float, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import enum
 from app.db.database import Base
+from app.db.functions import utc_now
 
 
 class Program(Base):
@@ -25,14 +25,26 @@ class Program(Base):
     target_muscle_groups = Column(String, nullable=True)  # Comma-separated list of muscle groups
     image_url = Column(String, nullable=True)  # Ссылка на фоновое изображение
     duration_weeks = Column(Integer, nullable=True)  # Длительность программы в неделях
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Время ставит БД (utc_now), а не Python
+    created_at = Column(DateTime, default=utc_now(), server_default=utc_now(), nullable=False)
+    updated_at = Column(DateTime, default=utc_now(), server_default=utc_now(), onupdate=utc_now(), nullable=False)
 
     # Relationships
     author = relationship("User", back_populates="programs")
     details = relationship("ProgramDetail", back_populates="program", cascade="all, delete-orphan")
     workout_logs = relationship("WorkoutLog", back_populates="program", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Триграммный GIN индекс для фильтра по группе мышц (ILIKE '%...%'), требует pg_trgm
+        Index(
+            'ix_programs_target_muscle_groups_trgm', 'target_muscle_groups',
+            postgresql_using='gin', postgresql_ops={'target_muscle_groups': 'gin_trgm_ops'}
+        ),
+        # Keyset пагинация списков программ по (created_at, id)
+        Index('ix_programs_created_id', created_at.desc(), id.desc()),
+        Index('ix_programs_author_created_id', 'author_id', created_at.desc(), id.desc()),
+    )
+
 
 class ProgramDetail(Base):
     """
@@ -65,10 +77,20 @@ class WorkoutLog(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     program_id = Column(UUID(as_uuid=True), ForeignKey("programs.id", ondelete="CASCADE"), nullable=False, index=True)
     day_number = Column(Integer, nullable=False)  # Какой день программы был выполнен
-    completed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = Column(DateTime, default=utc_now(), server_default=utc_now(), nullable=False)
     duration_minutes = Column(Integer, nullable=True)
     notes = Column(String, nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="workout_logs")
     program = relationship("Program", back_populates="workout_logs")
+
+    __table_args__ = (
+        # Keyset пагинация истории тренировок по (completed_at, id)
+        Index('ix_workout_logs_user_completed_id', 'user_id', completed_at.desc(), id.desc()),
+        # Подсчет и история тренировок по программе пользователя
+        Index('ix_workout_logs_user_program_completed', 'user_id', 'program_id', completed_at.desc()),
+        # Одна запись на программу в день: цель ON CONFLICT в log_workout
+        # и проверка "тренировка за сегодня" (равенство по date(completed_at))
+        Index('ux_workout_logs_user_program_day', 'user_id', 'program_id', func.date(completed_at), unique=True),
+    )
@@ -3,8 +3,9 @@
 """
 import uuid
 from datetime import datetime, date
-from sqlalchemy import Column, String, Boolean, DateTime, Enum, ForeignKey, Date, Float, Integer
+from sqlalchemy import Column, String, Boolean, DateTime, Enum, ForeignKey, Date, Float, Integer, cast, func
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 import enum
 from app.db.database import Base
@@ -94,3 +95,20 @@ class UserProfile(Base):
     user = relationship("User", back_populates="profile")
     current_program = relationship("Program", foreign_keys=[current_program_id])
 
+    @hybrid_property
+    def age(self):
+        """
+        Полное количество лет на сегодня (с учетом високосных лет)
+        """
+        if self.birth_date is None:
+            return None
+        today = date.today()
+        return today.year - self.birth_date.year - (
+            (today.month, today.day) < (self.birth_date.month, self.birth_date.day)
+        )
+
+    @age.expression
+    def age(cls):
+        # Вычисляется на стороне БД, можно использовать в фильтрах (WHERE age BETWEEN ...)
+        return cast(func.date_part('year', func.age(cls.birth_date)), Integer)
+
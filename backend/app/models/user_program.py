@@ -2,12 +2,12 @@
 Модель UserProgram для отслеживания статуса программ пользователя (активные, сохраненные, завершенные)
 """
 import uuid
-from datetime import datetime
-from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import enum
 from app.db.database import Base
+from app.db.functions import utc_now
 
 class ProgramStatus(str, enum.Enum):
     STARTED = "started"       # Программа начата (активна или была активна)
@@ -27,9 +27,17 @@ class UserProgram(Base):
     # У пользователя должна быть только одна is_active=True программа
     is_active = Column(Boolean, default=False, nullable=False)
     
-    start_date = Column(DateTime, default=datetime.utcnow, nullable=True)
-    last_interaction_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Время ставит БД (utc_now), а не Python
+    start_date = Column(DateTime, default=utc_now(), server_default=utc_now(), nullable=True)
+    last_interaction_at = Column(DateTime, default=utc_now(), server_default=utc_now(), onupdate=utc_now())
     
     # Relationships
     user = relationship("User", back_populates="user_programs")
     program = relationship("Program")
+
+    __table_args__ = (
+        # Одна запись на пару пользователь-программа, цель ON CONFLICT в start_program
+        Index('ix_user_programs_user_program', 'user_id', 'program_id', unique=True),
+        # Поиск активной программы пользователя (частичный индекс - только активные строки)
+        Index('ix_user_programs_user_active', 'user_id', postgresql_where=is_active),
+    )
@@ -36,6 +36,24 @@ class ArticleUpdate(BaseModel):
     is_published: Optional[bool] = None
 
 
+class ArticleListItem(BaseModel):
+    """Схема статьи в списке (без контента и списка просмотревших)"""
+    id: UUID
+    title: str
+    html_file_name: Optional[str] = None
+    html_file_url: Optional[str] = None
+    author_id: Optional[UUID] = None
+    tags: Optional[List[str]] = []
+    cover_image_url: Optional[str] = None
+    excerpt: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    is_published: bool
+    views_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class ArticleResponse(BaseModel):
     """Схема ответа со статьей"""
     id: UUID
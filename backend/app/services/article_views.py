@@ -0,0 +1,99 @@
+"""
+Буфер просмотров статей
+Просмотры копятся в памяти воркера и периодически записываются в БД одним
+пакетным UPDATE, чтобы чтение статьи не делало запись в articles
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Set
+from uuid import UUID
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# article_id -> id пользователей, просмотры которых еще не записаны в БД
+_pending: Dict[UUID, Set[UUID]] = defaultdict(set)
+
+# Добавляем в viewed_by только тех пользователей, которых там еще нет
+# (другой воркер мог записать тот же просмотр раньше)
+_FLUSH_SQL = text("""
+    UPDATE articles AS a
+    SET viewed_by = coalesce(a.viewed_by, '{}') || data.new_ids
+    FROM (
+        SELECT v.article_id, array_agg(DISTINCT v.user_id) AS new_ids
+        FROM unnest(:article_ids, :user_ids) AS v(article_id, user_id)
+        JOIN articles AS cur ON cur.id = v.article_id
+        WHERE NOT (v.user_id = ANY(coalesce(cur.viewed_by, '{}')))
+        GROUP BY v.article_id
+    ) AS data
+    WHERE a.id = data.article_id
+""").bindparams(
+    bindparam("article_ids", type_=ARRAY(PG_UUID(as_uuid=True))),
+    bindparam("user_ids", type_=ARRAY(PG_UUID(as_uuid=True))),
+)
+
+
+def record_view(article_id: UUID, user_id: UUID) -> None:
+    """
+    Запомнить просмотр статьи пользователем (запись в БД при следующем flush)
+    """
+    _pending[article_id].add(user_id)
+
+
+def is_pending(article_id: UUID, user_id: UUID) -> bool:
+    """
+    Есть ли незаписанный просмотр статьи этим пользователем
+    """
+    return user_id in _pending.get(article_id, ())
+
+
+async def flush_views() -> int:
+    """
+    Записать накопленные просмотры в БД одним UPDATE
+    Возвращает количество записанных пар (статья, пользователь)
+    """
+    if not _pending:
+        return 0
+
+    pending = dict(_pending)
+    _pending.clear()
+
+    article_ids = []
+    user_ids = []
+    for article_id, users in pending.items():
+        for user_id in users:
+            article_ids.append(article_id)
+            user_ids.append(user_id)
+
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(_FLUSH_SQL, {"article_ids": article_ids, "user_ids": user_ids})
+            await session.commit()
+    except Exception as e:
+        # Возвращаем просмотры в буфер, чтобы записать их при следующей попытке
+        for article_id, users in pending.items():
+            _pending[article_id].update(users)
+        logger.error(f"Failed to flush article views: {e}")
+        return 0
+
+    return len(user_ids)
+
+
+async def run_views_flusher() -> None:
+    """
+    Фоновая задача: раз в ARTICLE_VIEWS_FLUSH_INTERVAL секунд записывает просмотры
+    """
+    try:
+        while True:
+            await asyncio.sleep(settings.ARTICLE_VIEWS_FLUSH_INTERVAL)
+            await flush_views()
+    except asyncio.CancelledError:
+        # Записываем остаток при остановке приложения
+        await flush_views()
+        raise
@@ -1,3 +1,4 @@
+import asyncio
 import cloudinary
 import cloudinary.uploader
 from fastapi import UploadFile, HTTPException
@@ -10,18 +11,39 @@ cloudinary.config(
   api_secret = settings.CLOUDINARY_API_SECRET 
 )
 
+# Размер части при загрузке (upload_large читает и отправляет файл частями)
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+
+
+def _check_configured() -> None:
+    if not settings.CLOUDINARY_CLOUD_NAME or not settings.CLOUDINARY_API_KEY or not settings.CLOUDINARY_API_SECRET:
+        raise HTTPException(status_code=500, detail="Cloudinary is not configured")
+
+
+async def _upload(file: UploadFile, folder: str, resource_type: str) -> str:
+    """
+    Stream the file to Cloudinary in UPLOAD_CHUNK_SIZE parts.
+    The SDK is synchronous, so the upload runs in a worker thread.
+    """
+    options = {"folder": folder, "resource_type": resource_type} if folder else {"resource_type": resource_type}
+    await file.seek(0)
+    result = await asyncio.to_thread(
+        cloudinary.uploader.upload_large,
+        file.file,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        **options
+    )
+    return result.get("secure_url")
+
+
 async def upload_image(file: UploadFile, folder: str = None) -> str:
     """
     Upload an image to Cloudinary and return the URL.
     """
-    if not settings.CLOUDINARY_CLOUD_NAME or not settings.CLOUDINARY_API_KEY or not settings.CLOUDINARY_API_SECRET:
-        raise HTTPException(status_code=500, detail="Cloudinary is not configured")
+    _check_configured()
         
     try:
-        # Cloudinary supports uploading file objects directly
-        options = {"folder": folder, "resource_type": "auto"} if folder else {"resource_type": "auto"}
-        result = cloudinary.uploader.upload(file.file, **options)
-        return result.get("secure_url")
+        return await _upload(file, folder, "auto")
     except Exception as e:
         print(f"Error uploading to Cloudinary: {e}")
         raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
@@ -31,14 +53,11 @@ async def upload_raw_file(file: UploadFile, folder: str = None) -> str:
     """
     Upload a raw file (HTML, text, etc.) to Cloudinary and return the URL.
     """
-    if not settings.CLOUDINARY_CLOUD_NAME or not settings.CLOUDINARY_API_KEY or not settings.CLOUDINARY_API_SECRET:
-        raise HTTPException(status_code=500, detail="Cloudinary is not configured")
+    _check_configured()
         
     try:
         # Для raw файлов используем resource_type="raw"
-        options = {"folder": folder, "resource_type": "raw"} if folder else {"resource_type": "raw"}
-        result = cloudinary.uploader.upload(file.file, **options)
-        return result.get("secure_url")
+        return await _upload(file, folder, "raw")
     except Exception as e:
         print(f"Error uploading raw file to Cloudinary: {e}")
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
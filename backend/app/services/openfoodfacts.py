@@ -1,15 +1,82 @@
 """
 Сервис для интеграции с Open Food Facts API
 """
+import asyncio
 import httpx
 from typing import Optional, Dict
 import logging
 
+from app.core.cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 # URL Open Food Facts API
 OPENFOODFACTS_API_URL = "https://world.openfoodfacts.org/api/v2"
 
+# Кэш найденных продуктов по штрихкоду (в пределах воркера)
+_product_cache = TTLCache(maxsize=10_000, ttl=3600)
+
+# Сколько секунд помнить, что штрихкода нет в Open Food Facts
+NOT_FOUND_TTL = 600
+
+# Маркер "продукта точно нет" (в отличие от None - ошибки запроса, которую не кэшируем)
+_NOT_FOUND = object()
+
+# Незавершенные запросы к Open Food Facts: параллельные запросы одного штрихкода ждут общий
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def cached_get_product_by_barcode(barcode: str) -> Optional[Dict]:
+    """
+    То же, что get_product_by_barcode, но с кэшированием результата
+    
+    Одновременные запросы одного и того же штрихкода объединяются
+    в один HTTP запрос к Open Food Facts. Отсутствующие штрихкоды
+    запоминаются на NOT_FOUND_TTL секунд и повторно не запрашиваются
+    
+    Args:
+        barcode: Штрихкод продукта
+    
+    Returns:
+        Dict с данными о продукте (копия) или None если не найден
+    """
+    cached = _product_cache.get(barcode)
+    if cached is _NOT_FOUND:
+        logger.info(f"Barcode {barcode} is cached as not found in Open Food Facts")
+        return None
+    if cached is not None:
+        return dict(cached)
+    
+    future = _inflight.get(barcode)
+    if future is None:
+        future = asyncio.get_running_loop().create_future()
+        _inflight[barcode] = future
+        try:
+            product_data = await _fetch_product(barcode)
+            if product_data is _NOT_FOUND:
+                _product_cache.set(barcode, product_data, ttl=NOT_FOUND_TTL)
+            elif product_data:
+                _product_cache.set(barcode, product_data)
+            future.set_result(product_data)
+        except BaseException:
+            # Ошибки HTTP обрабатываются в _fetch_product, сюда попадает только отмена запроса
+            future.cancel()
+            raise
+        finally:
+            _inflight.pop(barcode, None)
+    else:
+        try:
+            product_data = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # Отменен запрос, который выполнял загрузку, - загружаем сами
+            product_data = await _fetch_product(barcode)
+    
+    if not product_data or product_data is _NOT_FOUND:
+        return None
+    return dict(product_data)
+
 
 async def get_product_by_barcode(barcode: str) -> Optional[Dict]:
     """
@@ -21,6 +88,18 @@ async def get_product_by_barcode(barcode: str) -> Optional[Dict]:
     Returns:
         Dict с данными о продукте или None если не найден
     """
+    product_data = await _fetch_product(barcode)
+    return None if product_data is _NOT_FOUND else product_data
+
+
+async def _fetch_product(barcode: str):
+    """
+    Запрос продукта в Open Food Facts
+    
+    Returns:
+        Dict с данными о продукте, _NOT_FOUND если продукта нет,
+        None при ошибке запроса
+    """
     url = f"{OPENFOODFACTS_API_URL}/product/{barcode}.json"
     
     try:
@@ -35,10 +114,10 @@ async def get_product_by_barcode(barcode: str) -> Optional[Dict]:
                     return parse_openfoodfacts_response(data)
                 else:
                     logger.info(f"Product with barcode {barcode} not found in Open Food Facts (status: {data.get('status')})")
-                    return None
+                    return _NOT_FOUND
             elif response.status_code == 404:
                 logger.info(f"Product with barcode {barcode} not found in Open Food Facts (404)")
-                return None
+                return _NOT_FOUND
             else:
                 logger.warning(f"Open Food Facts API returned status {response.status_code} for barcode {barcode}")
                 return None
@@ -16,6 +16,28 @@ from app.models.nutrition import FoodProduct
 
 logger = logging.getLogger(__name__)
 
+# Множители активности
+ACTIVITY_MULTIPLIERS = {
+    "sedentary": 1.2,
+    "lightly_active": 1.375,
+    "moderately_active": 1.55,
+    "very_active": 1.725,
+    "extremely_active": 1.9
+}
+
+
+def calculate_bmr(
+    weight_kg: float,
+    height_cm: float,
+    age: int,
+    gender: str
+) -> float:
+    """
+    Расчет Basal Metabolic Rate (BMR) по формуле Mifflin-St Jeor
+    """
+    bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age
+    return bmr + 5 if gender.lower() == "male" else bmr - 161
+
 
 def calculate_tdee(
     weight_kg: float,
@@ -28,21 +50,7 @@ def calculate_tdee(
     Расчет Total Daily Energy Expenditure (TDEE)
     Использует формулу Mifflin-St Jeor для BMR
     """
-    # BMR расчет
-    if gender.lower() == "male":
-        bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age + 5
-    else:
-        bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
-    
-    # Множители активности
-    activity_multipliers = {
-        "sedentary": 1.2,
-        "lightly_active": 1.375,
-        "moderately_active": 1.55,
-        "very_active": 1.725,
-        "extremely_active": 1.9
-    }
-    
-    multiplier = activity_multipliers.get(activity_level.lower(), 1.2)
+    bmr = calculate_bmr(weight_kg, height_cm, age, gender)
+    multiplier = ACTIVITY_MULTIPLIERS.get(activity_level.lower(), 1.2)
     return bmr * multiplier
 
@@ -2,10 +2,12 @@
 Сервис для распознавания продуктов по фотографии с помощью AI
 Поддерживает несколько провайдеров: OpenAI, Google Vision, Spoonacular
 """
+import asyncio
 import base64
 import io
+import json
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +22,60 @@ try:
 except ImportError:
     pytesseract = None
 
+# Промпт OpenAI для распознавания продукта на одном изображении
+OPENAI_PRODUCT_PROMPT = """Ты эксперт по питанию и распознаванию продуктов. Проанализируй это изображение и определи продукт питания.
+
+АНАЛИЗИРУЙ:
+1. Что изображено на фото (продукт, упаковка, готовое блюдо и т.д.)
+2. Название продукта на русском языке (максимально точное)
+3. Бренд (если виден на упаковке/этикетке)
+4. Категорию продукта
+5. КБЖУ на 100г:
+   - Если видна информация о КБЖУ на упаковке/этикетке - используй ТОЧНЫЕ значения оттуда
+   - Если информации нет - оцени на основе визуального анализа и типичных значений для этого продукта
+   - Учитывай способ приготовления (сырое, вареное, жареное и т.д.)
+
+ВЕРНИ ОТВЕТ ТОЛЬКО В ФОРМАТЕ JSON, БЕЗ ДОПОЛНИТЕЛЬНОГО ТЕКСТА:
+{
+    "name": "точное название продукта на русском языке",
+    "description": "краткое описание продукта (1-2 предложения)",
+    "estimated_calories_per_100g": число или null,
+    "estimated_proteins_per_100g": число или null,
+    "estimated_fats_per_100g": число или null,
+    "estimated_carbs_per_100g": число или null,
+    "brand": "бренд" или null,
+    "category": "категория продукта (овощи, фрукты, мясо, молочные продукты и т.д.)",
+    "confidence": "высокая" или "средняя" или "низкая"
+}
+
+ПРАВИЛА:
+- Все числа должны быть числовыми значениями (не строками), например: 41, а не "41" или "41 ккал"
+- Если не можешь определить значение - используй null
+- Название продукта должно быть максимально точным (например, "Морковь", а не "Овощ")
+- Если видишь текст на упаковке с КБЖУ - используй эти значения
+- Будь максимально точным и внимательным"""
+
+
+# Числовые оценки КБЖУ в ответе распознавания
+ESTIMATE_KEYS = (
+    'estimated_calories_per_100g',
+    'estimated_proteins_per_100g',
+    'estimated_fats_per_100g',
+    'estimated_carbs_per_100g',
+)
+
+
+def _normalize_estimates(product_data: Dict[str, Any]) -> None:
+    """
+    Приводит оценки КБЖУ к float (нечисловые значения заменяются на None)
+    """
+    for key in ESTIMATE_KEYS:
+        if key in product_data and product_data[key] is not None:
+            try:
+                product_data[key] = float(product_data[key])
+            except (ValueError, TypeError):
+                product_data[key] = None
+
 
 async def recognize_product_openai(image_data: bytes, api_key: str) -> Optional[Dict[str, Any]]:
     """
@@ -55,37 +111,7 @@ async def recognize_product_openai(image_data: bytes, api_key: str) -> Optional[
             "Content-Type": "application/json"
         }
         
-        prompt = """Ты эксперт по питанию и распознаванию продуктов. Проанализируй это изображение и определи продукт питания.
-
-АНАЛИЗИРУЙ:
-1. Что изображено на фото (продукт, упаковка, готовое блюдо и т.д.)
-2. Название продукта на русском языке (максимально точное)
-3. Бренд (если виден на упаковке/этикетке)
-4. Категорию продукта
-5. КБЖУ на 100г:
-   - Если видна информация о КБЖУ на упаковке/этикетке - используй ТОЧНЫЕ значения оттуда
-   - Если информации нет - оцени на основе визуального анализа и типичных значений для этого продукта
-   - Учитывай способ приготовления (сырое, вареное, жареное и т.д.)
-
-ВЕРНИ ОТВЕТ ТОЛЬКО В ФОРМАТЕ JSON, БЕЗ ДОПОЛНИТЕЛЬНОГО ТЕКСТА:
-{
-    "name": "точное название продукта на русском языке",
-    "description": "краткое описание продукта (1-2 предложения)",
-    "estimated_calories_per_100g": число или null,
-    "estimated_proteins_per_100g": число или null,
-    "estimated_fats_per_100g": число или null,
-    "estimated_carbs_per_100g": число или null,
-    "brand": "бренд" или null,
-    "category": "категория продукта (овощи, фрукты, мясо, молочные продукты и т.д.)",
-    "confidence": "высокая" или "средняя" или "низкая"
-}
-
-ПРАВИЛА:
-- Все числа должны быть числовыми значениями (не строками), например: 41, а не "41" или "41 ккал"
-- Если не можешь определить значение - используй null
-- Название продукта должно быть максимально точным (например, "Морковь", а не "Овощ")
-- Если видишь текст на упаковке с КБЖУ - используй эти значения
-- Будь максимально точным и внимательным"""
+        prompt = OPENAI_PRODUCT_PROMPT
 
         payload = {
             "model": "gpt-4o",
@@ -173,13 +199,7 @@ async def recognize_product_openai(image_data: bytes, api_key: str) -> Optional[
                 return None
             
             # Убеждаемся, что числовые значения действительно числа
-            for key in ['estimated_calories_per_100g', 'estimated_proteins_per_100g', 
-                       'estimated_fats_per_100g', 'estimated_carbs_per_100g']:
-                if key in product_data and product_data[key] is not None:
-                    try:
-                        product_data[key] = float(product_data[key])
-                    except (ValueError, TypeError):
-                        product_data[key] = None
+            _normalize_estimates(product_data)
             
             print(f"    ✅ [OpenAI] Recognition completed!")
             print(f"       Product: {product_data.get('name')}")
@@ -1228,3 +1248,147 @@ async def recognize_product(
         logger.error(f"Error in {provider} recognition after {elapsed_time:.2f}s: {e}", exc_info=True)
         return None
 
+
+def _openai_image_part(image_data: bytes) -> Dict[str, Any]:
+    """
+    Часть сообщения OpenAI с изображением (data URL)
+    """
+    image = Image.open(io.BytesIO(image_data))
+    mime_type = f"image/{image.format.lower()}" if image.format else "image/jpeg"
+    image_base64 = base64.b64encode(image_data).decode('utf-8')
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{mime_type};base64,{image_base64}",
+            "detail": "high"
+        }
+    }
+
+
+async def recognize_products_openai(images: List[bytes], api_key: str) -> List[Optional[Dict[str, Any]]]:
+    """
+    Распознавание нескольких продуктов одним запросом к OpenAI
+    Все изображения передаются в одном сообщении; каждый объект ответа содержит
+    номер своего изображения (image_index), результат сопоставляется по номеру,
+    а не по порядку в ответе
+    
+    Args:
+        images: Байты изображений
+        api_key: OpenAI API ключ
+        
+    Returns:
+        Список результатов по порядку изображений (None для изображения, для
+        которого нет корректного объекта с его номером)
+    """
+    if len(images) == 1:
+        return [await recognize_product_openai(images[0], api_key)]
+    
+    import httpx
+    
+    if Image is None:
+        logger.error("PIL/Pillow not installed")
+        return [None] * len(images)
+    
+    prompt = (
+        f"Тебе передано {len(images)} изображений. Для КАЖДОГО изображения выполни анализ "
+        f"по инструкции ниже и верни ответ ТОЛЬКО в формате JSON: "
+        f'{{"products": [объект для изображения 1, объект для изображения 2, ...]}}, '
+        f"ровно {len(images)} объектов. Изображения пронумерованы от 1 до {len(images)}; "
+        f'в каждый объект добавь поле "image_index" с номером изображения, к которому он относится.\n\n'
+        f"{OPENAI_PRODUCT_PROMPT}"
+    )
+    
+    try:
+        content = [{"type": "text", "text": prompt}]
+        for index, image_data in enumerate(images, start=1):
+            content.append({"type": "text", "text": f"Изображение {index}:"})
+            content.append(_openai_image_part(image_data))
+        payload = {
+            "model": "gpt-4o",
+            "messages": [{"role": "user", "content": content}],
+            "max_tokens": 800 * len(images),
+            "temperature": 0.2,
+            "response_format": {"type": "json_object"}
+        }
+        
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.post(
+                "https://api.openai.com/v1/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+                json=payload
+            )
+        
+        if response.status_code != 200:
+            logger.error(f"OpenAI API error {response.status_code}: {response.text}")
+            return [None] * len(images)
+        
+        products = json.loads(response.json()["choices"][0]["message"]["content"]).get("products")
+        if not isinstance(products, list):
+            logger.error("OpenAI batch response has no products list")
+            return [None] * len(images)
+        
+        # Сопоставляем по image_index; объекты без корректного номера и все
+        # объекты с повторяющимся номером отбрасываются (результат - None)
+        by_index: Dict[int, List[Dict[str, Any]]] = {}
+        for product_data in products:
+            index = product_data.pop("image_index", None) if isinstance(product_data, dict) else None
+            if isinstance(index, int) and 1 <= index <= len(images):
+                by_index.setdefault(index, []).append(product_data)
+            else:
+                logger.warning(f"OpenAI batch item with invalid image_index: {index!r}")
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        for index, items in by_index.items():
+            if len(items) == 1:
+                _normalize_estimates(items[0])
+                results[index - 1] = items[0]
+            else:
+                logger.warning(f"OpenAI batch returned {len(items)} items for image {index}")
+        
+        logger.info(f"[OpenAI GPT-4 Vision] Batch recognition completed: {len(images)} images")
+        return results
+        
+    except Exception as e:
+        logger.error(f"Error recognizing products batch with OpenAI: {e}", exc_info=True)
+        return [None] * len(images)
+
+
+async def recognize_products(
+    images: List[bytes],
+    provider: str = "openai",
+    api_key: Optional[str] = None
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Распознавание нескольких продуктов
+    OpenAI принимает все изображения одним запросом (изображения, для которых
+    пакет не дал результата, повторно распознаются по одному через
+    recognize_product), остальные провайдеры вызываются параллельно
+    по одному изображению
+    
+    Args:
+        images: Байты изображений
+        provider: Провайдер (как в recognize_product)
+        api_key: API ключ провайдера
+        
+    Returns:
+        Список результатов (Dict или None) по порядку изображений
+    """
+    if provider == "openai" and api_key and len(images) > 1:
+        results = await recognize_products_openai(images, api_key)
+        # Изображения без результата пакета распознаются по одному
+        failed = [i for i, result in enumerate(results) if result is None]
+        if failed:
+            logger.warning(f"OpenAI batch: {len(failed)} of {len(images)} images fall back to single requests")
+            retried = await asyncio.gather(
+                *(recognize_product(images[i], provider, api_key) for i in failed)
+            )
+            for i, result in zip(failed, retried):
+                results[i] = result
+        return results
+    
+    return list(await asyncio.gather(
+        *(recognize_product(image_data, provider, api_key) for image_data in images)
+    ))
@@ -0,0 +1,215 @@
+"""
+Очередь запросов на распознавание продуктов
+Запросы одного пользователя, пришедшие в течение короткого окна, объединяются
+в один пакет и отправляются провайдеру одним вызовом recognize_products
+"""
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.product_recognition import recognize_products
+
+logger = logging.getLogger(__name__)
+
+
+class RecognitionQueueFull(Exception):
+    """
+    Очередь распознавания переполнена (роут отвечает 503)
+    """
+
+
+@dataclass
+class _RecognitionRequest:
+    image_data: bytes
+    provider: str
+    api_key: Optional[str]
+    owner: Hashable
+    future: "asyncio.Future[Optional[Dict[str, Any]]]" = field(repr=False)
+
+
+class RecognitionBatchQueue:
+    """
+    Пакетная очередь распознавания
+
+    Фоновая задача забирает до max_batch_size запросов, ожидая следующие
+    не дольше max_wait_time секунд, группирует их по провайдеру, ключу
+    и владельцу (изображения разных пользователей в один запрос к провайдеру
+    не попадают) и раздает результаты по Future каждого запроса
+
+    Одновременно к провайдеру уходит не больше max_concurrency пакетов, старт
+    каждого сдвигается на случайную задержку до max_jitter секунд, чтобы пакеты
+    не упирались в rate limit провайдера одновременно. Если в очереди уже
+    max_pending запросов, новые отклоняются исключением RecognitionQueueFull
+
+    Args:
+        max_batch_size: Максимальный размер пакета
+        max_wait_time: Сколько секунд ждать добора пакета
+        max_concurrency: Максимум одновременных запросов к провайдеру
+        max_pending: Максимум ожидающих запросов
+        max_jitter: Максимальная случайная задержка перед запросом к провайдеру
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 8,
+        max_wait_time: float = 0.1,
+        max_concurrency: int = 4,
+        max_pending: int = 64,
+        max_jitter: float = 0.05
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        self.max_pending = max_pending
+        self.max_jitter = max_jitter
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = 0
+        self._queue: Optional["asyncio.Queue[_RecognitionRequest]"] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Ссылки на выполняющиеся пакеты (иначе задачу может собрать GC)
+        self._running: Set[asyncio.Task] = set()
+
+    def _ensure_worker(self) -> None:
+        """
+        Запускает фоновую задачу при первом запросе (и после ее остановки)
+        """
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._process_loop())
+
+    async def add_request(
+        self,
+        image_data: bytes,
+        provider: str,
+        api_key: Optional[str],
+        owner: Hashable
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Поставить изображение в очередь и дождаться результата распознавания
+
+        Args:
+            image_data: Байты изображения
+            provider: Провайдер распознавания
+            api_key: API ключ провайдера
+            owner: Владелец изображения (id пользователя); в пакет попадают
+                только изображения одного владельца
+
+        Returns:
+            Dict с информацией о продукте или None
+
+        Raises:
+            RecognitionQueueFull: В очереди уже max_pending запросов
+        """
+        if self._pending >= self.max_pending:
+            logger.warning(f"Recognition queue is full ({self._pending} pending requests)")
+            raise RecognitionQueueFull()
+
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._pending += 1
+        try:
+            await self._queue.put(_RecognitionRequest(image_data, provider, api_key, owner, future))
+            return await future
+        finally:
+            self._pending -= 1
+
+    async def _collect_batch(self) -> List[_RecognitionRequest]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait_time
+
+        try:
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Остановка во время сбора пакета: ожидающие запросы не зависают
+            for request in batch:
+                request.future.cancel()
+            raise
+
+        return batch
+
+    async def _process_loop(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+
+            groups: Dict[Tuple[str, Optional[str], Hashable], List[_RecognitionRequest]] = defaultdict(list)
+            for request in batch:
+                # Отмененные клиентом запросы провайдеру не отправляем
+                if not request.future.done():
+                    groups[(request.provider, request.api_key, request.owner)].append(request)
+
+            # Пакет обрабатывается отдельной задачей, пока собирается следующий
+            for (provider, api_key, _), requests in groups.items():
+                task = asyncio.create_task(self._run_group(provider, api_key, requests))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _run_group(
+        self,
+        provider: str,
+        api_key: Optional[str],
+        requests: List[_RecognitionRequest]
+    ) -> None:
+        try:
+            # Случайный сдвиг старта: пакеты не приходят к провайдеру одновременно
+            await asyncio.sleep(random.random() * self.max_jitter)
+            async with self._semaphore:
+                logger.info(f"Recognition batch: provider={provider}, size={len(requests)}")
+                results = await recognize_products(
+                    [request.image_data for request in requests],
+                    provider=provider,
+                    api_key=api_key
+                )
+        except asyncio.CancelledError:
+            # Остановка приложения: ожидающие запросы не зависают
+            for request in requests:
+                request.future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Recognition batch failed: {e}", exc_info=True)
+            results = [None] * len(requests)
+
+        for request, result in zip(requests, results):
+            if not request.future.done():
+                request.future.set_result(result)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """
+        Остановить очередь (при остановке приложения)
+
+        Выполняющиеся пакеты дорабатывают не дольше timeout секунд, затем
+        отменяются; запросы, не попавшие в пакет, отменяются сразу
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._running:
+            _, pending = await asyncio.wait(set(self._running), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        while self._queue is not None and not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
+
+
+recognition_queue = RecognitionBatchQueue(
+    max_batch_size=settings.RECOGNITION_BATCH_SIZE,
+    max_wait_time=settings.RECOGNITION_BATCH_WAIT,
+    max_concurrency=settings.RECOGNITION_MAX_CONCURRENCY,
+    max_pending=settings.RECOGNITION_MAX_PENDING
+)